@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'beak_terminal.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported once Django is set up, since it reads the settings
+from .progress import PATH_PATTERN, progress_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # job progress streams are served outside Django, which would hold a thread per open stream
+    if scope["type"] == "http" and PATH_PATTERN.fullmatch(scope["path"]):
+        await progress_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -1,7 +1,47 @@
 import os
-from celery import Celery
+from celery import Celery, bootsteps
+from celery.signals import celeryd_init, worker_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "beak_terminal.settings")
 app = Celery("beak_terminal")
 app.config_from_object("django.conf:settings", namespace="CELERY")
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
+
+
+@worker_init.connect
+def prewarm_stan_models(**kwargs):
+    # compile/load Stan executables once in the parent worker process; pool processes inherit them
+    from stan.lda.registry import prewarm
+    prewarm()
+
+
+@celeryd_init.connect
+def configure_queue_worker(sender=None, instance=None, conf=None, options=None, **kwargs):
+    # a worker serving a single routed queue takes that queue's concurrency and prefetch, unless given.
+    # Celery's command line fills options it was not given with the configured value, so an option equal
+    # to it counts as not given.
+    from .routing import QUEUE_WORKER_SETTINGS
+    queues = options.get("queues") or []
+    if isinstance(queues, str):
+        queues = queues.split(",")
+    if len(queues) != 1 or queues[0] not in QUEUE_WORKER_SETTINGS:
+        return
+    for name, value in QUEUE_WORKER_SETTINGS[queues[0]].items():
+        option = name.replace("worker_", "")
+        if options.get(option) is None or options[option] == conf[name]:
+            conf[name] = value
+            options[option] = value
+            if instance is not None:
+                instance.queue_worker_settings = {**getattr(instance, "queue_worker_settings", {}), option: value}
+
+
+class QueueWorkerSettings(bootsteps.Step):
+    # the worker takes its settings from its own arguments after celeryd_init, so the ones chosen by
+    # configure_queue_worker are set on it again before its pool and consumer are created
+    def __init__(self, worker, **kwargs):
+        super().__init__(worker, **kwargs)
+        for option, value in getattr(worker, "queue_worker_settings", {}).items():
+            setattr(worker, option, value)
+
+
+app.steps["worker"].add(QueueWorkerSettings)
@@ -0,0 +1,56 @@
+from django.db.models import Count
+from django.http import HttpResponse
+
+from dgp.models import LDA as DGP_LDA
+from stan.models import LDA as STAN_LDA
+
+# Job metrics in the Prometheus text exposition format, for scraping: job counts by status, and the stage
+# breakdowns (stage_metrics) of the successful jobs summed per stage, with the largest stage peak memory.
+# Stage totals only grow as jobs succeed, so they are exposed as counters.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+MODELS = {"dgp": DGP_LDA, "stan": STAN_LDA}
+STAGE_METRICS = (
+    ("seconds", "beak_stage_seconds_total", "counter", "Wall time spent in the stage"),
+    ("calls", "beak_stage_calls_total", "counter", "Times the stage ran"),
+    ("items", "beak_stage_items_total", "counter", "Items (documents, pairs, draws) the stage processed"),
+    ("peak_memory", "beak_stage_peak_memory_mb", "gauge", "Largest peak resident memory of the stage in MB"),
+)
+
+
+def aggregate_stages(model):
+    # {stage: {"seconds", "calls", "items", "peak_memory"}} over the successful jobs of model
+    stages = {}
+    rows = model.objects.filter(task_status=model.TaskStatus.SUC).values_list('stage_metrics', flat=True)
+    for breakdown in rows.iterator():
+        for stage in breakdown:
+            total = stages.setdefault(stage["stage"], {"seconds": 0.0, "calls": 0, "items": None,
+                                                       "peak_memory": None})
+            total["seconds"] += stage["seconds"]
+            total["calls"] += stage["calls"]
+            if stage["items"] is not None:
+                total["items"] = (total["items"] or 0) + stage["items"]
+            if stage["peak_memory"] is not None:
+                total["peak_memory"] = max(total["peak_memory"] or 0.0, stage["peak_memory"])
+    return stages
+
+
+def render():
+    lines = ["# HELP beak_jobs Jobs by kind and task status", "# TYPE beak_jobs gauge"]
+    stages = {}
+    for kind, model in MODELS.items():
+        counts = dict(model.objects.values_list('task_status').annotate(count=Count('id')))
+        for task_status in model.TaskStatus.values:
+            lines.append(f'beak_jobs{{kind="{kind}",status="{task_status}"}} {counts.get(task_status, 0)}')
+        stages[kind] = aggregate_stages(model)
+
+    for field, name, metric_type, description in STAGE_METRICS:
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+        for kind, totals in stages.items():
+            for stage, total in totals.items():
+                if total[field] is not None:
+                    lines.append(f'{name}{{kind="{kind}",stage="{stage}"}} {total[field]}')
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
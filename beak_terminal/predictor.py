@@ -0,0 +1,88 @@
+import numpy as np
+from django.conf import settings
+
+from dgp.models import LDA as DGP_LDA
+from stan.models import LDA as STAN_LDA
+
+# Runtime and peak memory of a job predicted from the successful jobs of the same kind before it: a power
+# law in the job's size parameters (get_size_features of the models), i.e. a least squares fit of
+# log(target) on log(features), refitted from the HISTORY latest rows on every prediction. The exponents
+# are ridge penalized by RIDGE, since sizes in the history are often confounded (bigger corpora with bigger
+# dictionaries) and an unpenalized fit extrapolates wildly along such directions. Targets with fewer than
+# MIN_ROWS rows of history are not predicted.
+HISTORY = 500
+MIN_ROWS = 8
+RIDGE = 1.0
+TARGETS = ("execution_time", "peak_memory")
+
+
+def fit_predict(rows, features):
+    prediction = {"history": len(rows)}
+    for target in TARGETS:
+        samples = [(row.get_size_features(), getattr(row, target)) for row in rows
+                   if getattr(row, target) is not None and getattr(row, target) > 0]
+        if len(samples) < MIN_ROWS:
+            prediction[target] = None
+            continue
+        X = np.log(np.array([sample[0] for sample in samples], dtype=float))
+        X = np.column_stack([np.ones(len(X)), X])
+        y = np.log(np.array([sample[1] for sample in samples], dtype=float))
+        penalty = RIDGE * np.eye(X.shape[1])
+        penalty[0, 0] = 0  # the intercept is not penalized
+        coef = np.linalg.solve(X.T @ X + penalty, X.T @ y)
+        prediction[target] = float(np.exp(coef[0] + np.log(np.array(features, dtype=float)) @ coef[1:]))
+    return prediction
+
+
+def predict_dgp(dgp_lda_obj):
+    # history of the same mode and corpus generation method, whose costs differ for the same sizes; cached
+    # and partly reused datasets did not generate everything and are left out
+    rows = DGP_LDA.objects.filter(task_status=DGP_LDA.TaskStatus.SUC, streaming=dgp_lda_obj.streaming,
+                                  corpus_gen_method=dgp_lda_obj.corpus_gen_method, reused_stages={}) \
+        .exclude(execution_time=0).order_by('-timestamp')[:HISTORY]
+    return fit_predict(list(rows), dgp_lda_obj.get_size_features())
+
+
+def predict_stan(stan_lda_obj):
+    rows = STAN_LDA.objects.filter(task_status=STAN_LDA.TaskStatus.SUC, sampler=stan_lda_obj.sampler,
+                                   likelihood=stan_lda_obj.likelihood).select_related('data') \
+        .order_by('-timestamp')[:HISTORY]
+    return fit_predict(list(rows), stan_lda_obj.get_size_features())
+
+
+def exceeds_budget(prediction):
+    return prediction["peak_memory"] is not None and prediction["peak_memory"] > settings.WORKER_MEMORY_BUDGET
+
+
+def get_budget_error(prediction):
+    return f"predicted peak memory {prediction['peak_memory']:.0f} MB exceeds the worker memory budget " \
+           f"of {settings.WORKER_MEMORY_BUDGET} MB"
+
+
+def admit_dgp(dgp_lda_obj):
+    # (prediction, field changes to apply, error) of a dataset about to be created; one predicted over the
+    # memory budget is switched to streaming, whose memory is bounded by the block size, or rejected
+    prediction = predict_dgp(dgp_lda_obj)
+    if not exceeds_budget(prediction):
+        return prediction, {}, None
+    if not dgp_lda_obj.streaming:
+        dgp_lda_obj.streaming = True
+        streamed = predict_dgp(dgp_lda_obj)
+        if not exceeds_budget(streamed):
+            return streamed, {"streaming": True}, None
+    return prediction, {}, get_budget_error(prediction)
+
+
+def admit_stan(stan_lda_obj):
+    # (prediction, field changes to apply, error) of an estimation about to be created; one predicted over
+    # the memory budget is switched from the token to the count likelihood, whose data has one entry per
+    # distinct (doc, word) pair, or rejected
+    prediction = predict_stan(stan_lda_obj)
+    if not exceeds_budget(prediction):
+        return prediction, {}, None
+    if stan_lda_obj.likelihood == STAN_LDA.Likelihood.TOK:
+        stan_lda_obj.likelihood = STAN_LDA.Likelihood.CNT
+        counted = predict_stan(stan_lda_obj)
+        if counted["peak_memory"] is not None and not exceeds_budget(counted):
+            return counted, {"likelihood": STAN_LDA.Likelihood.CNT}, None
+    return prediction, {}, get_budget_error(prediction)
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import logging
+import re
+import time
+
+import redis
+import redis.asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+# Live progress of running jobs, kept in Redis rather than in the SQL rows: the latest report of a job is
+# stored under progress:<kind>:<id> and published on the channel of the same name, from which
+# progress_application streams it to clients as server-sent events. Reporting is best effort; a job never
+# fails because Redis is unreachable.
+KINDS = ("dgp", "stan")
+TTL = 24 * 60 * 60  # seconds a report is kept after the last update
+MIN_INTERVAL = 1.0  # seconds between two reports of the same stage
+HEARTBEAT = 15.0  # seconds between keep-alive comments of an idle stream
+RETRY_INTERVAL = 30.0  # seconds reports are dropped after Redis failed
+FINAL_STATUSES = ("success", "failure")
+PATH_PATTERN = re.compile(r"/api/progress/(?P<kind>[a-z]+)/(?P<id>\d+)/?")
+
+logger = logging.getLogger(__name__)
+_client = None
+_retry_at = 0.0
+
+
+def get_key(kind, id):
+    return f"progress:{kind}:{id}"
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.PROGRESS_REDIS_URL, socket_timeout=1.0, socket_connect_timeout=1.0)
+    return _client
+
+
+def publish(kind, id, report):
+    global _retry_at
+    if time.time() < _retry_at:
+        return
+    message = json.dumps(report)
+    try:
+        client = get_client()
+        client.set(get_key(kind, id), message, ex=TTL)
+        client.publish(get_key(kind, id), message)
+    except redis.RedisError as e:
+        _retry_at = time.time() + RETRY_INTERVAL
+        logger.warning("progress reporting failed, retrying in %.0fs: %s", RETRY_INTERVAL, e)
+
+
+def get_task_status(kind, id):
+    # task status of a job in the database, None for an unknown job
+    from dgp.models import LDA as DGP_LDA
+    from stan.models import LDA as STAN_LDA
+    model = {"dgp": DGP_LDA, "stan": STAN_LDA}[kind]
+    return model.objects.filter(id=id).values_list("task_status", flat=True).first()
+
+
+def report_status(kind, id, status):
+    # task status changes; a final one ends the job's streams
+    publish(kind, id, {"status": status, "timestamp": time.time()})
+
+
+class ProgressReporter:
+    # Reports of one job: the current stage, units done out of total in it, and the stage's ETA from its
+    # rate so far. A stage change is always reported, updates within a stage at most every MIN_INTERVAL.
+    def __init__(self, kind, id):
+        assert kind in KINDS, f"progress reporting: invalid kind {kind}"
+        self.kind = kind
+        self.id = id
+        self.stage = None
+        self.stage_start = None
+        self.last_report = 0.0
+
+    def __call__(self, stage, done=None, total=None):
+        now = time.time()
+        if stage != self.stage:
+            self.stage, self.stage_start = stage, now
+        elif now - self.last_report < MIN_INTERVAL and done != total:
+            return
+        self.last_report = now
+        eta = None
+        if done and total:
+            eta = (now - self.stage_start) / done * (total - done)
+        publish(self.kind, self.id, {"status": "running", "stage": stage, "done": done, "total": total,
+                                     "eta": eta, "timestamp": now})
+
+
+async def send_event(send, report):
+    await send({"type": "http.response.body", "body": f"data: {report}\n\n".encode(), "more_body": True})
+
+
+async def send_not_found(send):
+    await send({"type": "http.response.start", "status": 404, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": b"not found"})
+
+
+async def progress_application(scope, receive, send):
+    # ASGI app streaming the reports of a job as server-sent events, the latest one first, until the job
+    # reaches a final status or the client disconnects. Reports are best effort and expire, so without one
+    # the job's status is taken from the database: on start and whenever the stream has been idle for
+    # HEARTBEAT, a job no longer pending or running ends the stream with its status.
+    match = PATH_PATTERN.fullmatch(scope["path"])
+    if match is None or match["kind"] not in KINDS:
+        await send_not_found(send)
+        return
+    kind, id = match["kind"], int(match["id"])
+    key = get_key(kind, id)
+
+    client = redis.asyncio.Redis.from_url(settings.PROGRESS_REDIS_URL)
+    pubsub = client.pubsub()
+    disconnect, message = None, None
+    try:
+        # subscribe before reading the latest report, so no report falls between the two
+        await pubsub.subscribe(key)
+        latest = await client.get(key)
+        report = latest.decode() if latest is not None else None
+        if report is None:
+            task_status = await sync_to_async(get_task_status)(kind, id)
+            if task_status is None:
+                await send_not_found(send)
+                return
+            if task_status in FINAL_STATUSES:
+                report = json.dumps({"status": task_status, "timestamp": time.time()})
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")]})
+        await receive()  # the (empty) request body
+        disconnect = asyncio.ensure_future(receive())
+        while report is None or json.loads(report)["status"] not in FINAL_STATUSES:
+            if report is not None:
+                await send_event(send, report)
+            message = asyncio.ensure_future(pubsub.get_message(ignore_subscribe_messages=True, timeout=HEARTBEAT))
+            await asyncio.wait((message, disconnect), return_when=asyncio.FIRST_COMPLETED)
+            if disconnect.done():
+                return
+            if message.result() is not None:
+                report = message.result()["data"].decode()
+                continue
+            task_status = await sync_to_async(get_task_status)(kind, id)
+            if task_status is None:  # deleted meanwhile
+                break
+            if task_status in FINAL_STATUSES:
+                report = json.dumps({"status": task_status, "timestamp": time.time()})
+            else:
+                await send({"type": "http.response.body", "body": b": heartbeat\n\n", "more_body": True})
+                report = None
+        else:
+            await send_event(send, report)
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        futures = [future for future in (disconnect, message) if future is not None]
+        for future in futures:
+            future.cancel()
+        await asyncio.gather(*futures, return_exceptions=True)
+        await pubsub.unsubscribe(key)
+        await pubsub.aclose()
+        await client.aclose()
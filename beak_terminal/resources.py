@@ -0,0 +1,100 @@
+import resource
+import time
+from contextlib import contextmanager
+
+# Peak resident memory of a job or a stage of it, in MB. On Linux the process high-water mark (VmHWM) is
+# reset when a measurement starts, so a worker process reused across jobs reports each job's own peak;
+# measurements nest, the mark reached before an inner reset being kept for the outer ones. CmdStan runs in
+# child processes, whose peak is only known when it raised the high-water mark of all children waited for;
+# it is counted once per child running at the same time (parallel chains) on top of the process's own
+# peak, an upper bound. Elsewhere the process lifetime peak is reported.
+CLEAR_REFS_PATH = "/proc/self/clear_refs"
+STATUS_PATH = "/proc/self/status"
+
+_measuring = []  # PeakMemory measurements in progress in this process
+
+
+def reset_peak():
+    peak = read_peak()
+    for measurement in _measuring:
+        measurement.folded_peak = max(measurement.folded_peak, peak)
+    try:
+        with open(CLEAR_REFS_PATH, "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def read_peak():
+    # peak resident memory of the process in MB, since the last reset
+    try:
+        with open(STATUS_PATH) as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PeakMemory:
+    def __init__(self, parallel_children=1):
+        self.parallel_children = parallel_children
+        self.peak = None
+        self.children_peak = None
+        self.folded_peak = 0.0
+
+    def __enter__(self):
+        self.children_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        reset_peak()
+        _measuring.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _measuring.remove(self)
+        self.peak = max(read_peak(), self.folded_peak)
+        children_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        if children_peak > self.children_peak:
+            self.peak += self.parallel_children * children_peak / 1024
+        return False
+
+
+class StageMetrics:
+    # Wall time, peak resident memory and items processed of the named stages of a task, accumulated over
+    # the calls of each stage, in the order the stages first ran. Stages running off the task's thread
+    # (a background write) are timed only, since the high-water mark is per process.
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name, items=None, memory=True, parallel_children=1):
+        # the yielded dict takes the item count when it is only known at the end of the stage
+        counts = {"items": items}
+        start_time = time.time()
+        if memory:
+            with PeakMemory(parallel_children) as measurement:
+                yield counts
+            peak = measurement.peak
+        else:
+            yield counts
+            peak = None
+        self.add(name, time.time() - start_time, peak, counts["items"])
+
+    def add(self, name, seconds, peak_memory=None, items=None, calls=1):
+        stage = self.stages.setdefault(name, {"stage": name, "seconds": 0.0, "peak_memory": None, "items": None,
+                                              "calls": 0})
+        stage["seconds"] += seconds
+        stage["calls"] += calls
+        if peak_memory is not None:
+            stage["peak_memory"] = max(stage["peak_memory"] or 0.0, peak_memory)
+        if items is not None:
+            stage["items"] = (stage["items"] or 0) + int(items)
+
+    def merge(self, stages):
+        # stages of the same task measured elsewhere, e.g. in a process pool
+        for stage in stages:
+            self.add(stage["stage"], stage["seconds"], stage["peak_memory"], stage["items"], stage["calls"])
+
+    def as_list(self):
+        return [dict(stage) for stage in list(self.stages.values())]
@@ -0,0 +1,29 @@
+# Tasks are routed by estimated cost (see get_cost of dgp.models.LDA and stan.models.LDA) to dedicated
+# queues, so small jobs are never queued behind large ones: dataset generation, CPU bound, and estimation
+# each have a small and a large queue. Every queue is served by its own worker, e.g.
+#   celery -A beak_terminal worker -Q stan-large -n stan-large@%h
+# which takes the concurrency and prefetch of QUEUE_WORKER_SETTINGS unless given on the command line.
+# Bookkeeping tasks (chord callbacks) go to the default queue, DGP_SMALL.
+DGP_SMALL = "dgp-small"
+DGP_LARGE = "dgp-large"
+STAN_SMALL = "stan-small"
+STAN_LARGE = "stan-large"
+
+# cost above which a job goes to a large queue
+DGP_LARGE_COST = 1e9
+STAN_LARGE_COST = 1e10
+
+QUEUE_WORKER_SETTINGS = {
+    DGP_SMALL: {"worker_concurrency": 4, "worker_prefetch_multiplier": 4},
+    DGP_LARGE: {"worker_concurrency": 2, "worker_prefetch_multiplier": 1},
+    STAN_SMALL: {"worker_concurrency": 4, "worker_prefetch_multiplier": 1},
+    STAN_LARGE: {"worker_concurrency": 1, "worker_prefetch_multiplier": 1},
+}
+
+
+def get_dgp_queue(dgp_lda_obj):
+    return DGP_LARGE if dgp_lda_obj.get_cost() > DGP_LARGE_COST else DGP_SMALL
+
+
+def get_stan_queue(stan_lda_obj):
+    return STAN_LARGE if stan_lda_obj.get_cost() > STAN_LARGE_COST else STAN_SMALL
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
     'rest_framework',
     'dgp',
     'stan',
+    'experiment',
 ]
 
 MIDDLEWARE = [
@@ -135,3 +137,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Celery settings
 CELERY_BROKER_URL = "redis://localhost:6379"
 CELERY_RESULT_BACKEND = "redis://localhost:6379"
+# live job progress (see beak_terminal.progress)
+PROGRESS_REDIS_URL = os.environ.get("PROGRESS_REDIS_URL", CELERY_BROKER_URL)
+# jobs are routed to cost-based queues (see beak_terminal.routing); the rest go to the small dgp queue
+CELERY_TASK_DEFAULT_QUEUE = "dgp-small"
+# peak memory in MB a single job may use on a worker; jobs predicted above it are switched to a cheaper
+# mode or rejected (see beak_terminal.predictor)
+WORKER_MEMORY_BUDGET = int(os.environ.get("WORKER_MEMORY_BUDGET", 8192))
+
+# save the fit of every estimation for later warm starts, not only of those warm starting themselves
+STAN_SAVE_FITS = os.environ.get("STAN_SAVE_FITS", "false").lower() == "true"
+# shared cache the Stan programs' executables are compiled into (one subdirectory per content hash)
+STAN_MODEL_CACHE_DIR = Path(os.environ.get("STAN_MODEL_CACHE_DIR", BASE_DIR / '.media' / 'models' / 'compiled'))
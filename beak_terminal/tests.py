@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+from celery.bin.base import CLIContext
+from celery.bin.worker import worker as worker_command
+from django.test import SimpleTestCase
+
+from .celery import QueueWorkerSettings, app, configure_queue_worker
+from .routing import QUEUE_WORKER_SETTINGS, STAN_LARGE
+
+
+def get_worker_options(argv):
+    # options of "celery worker <argv>" as Celery's command line passes them to the worker
+    ctx = worker_command.make_context("worker", argv, obj=CLIContext(app, no_color=True, workdir=None, quiet=True))
+    return dict(ctx.params)
+
+
+class QueueWorkerTest(SimpleTestCase):
+    def configure(self, argv):
+        # (settings the worker runs with, conf) after celeryd_init and the worker bootsteps
+        conf = {name: app.conf[name] for name in QUEUE_WORKER_SETTINGS[STAN_LARGE]}
+        options = get_worker_options(argv)
+        instance = SimpleNamespace(**{name.replace("worker_", ""): options[name.replace("worker_", "")]
+                                      for name in conf})
+        configure_queue_worker(instance=instance, conf=conf, options=options)
+        QueueWorkerSettings(instance)
+        return vars(instance), conf
+
+    def test_queue_settings_are_applied(self):
+        settings, conf = self.configure(["-Q", STAN_LARGE])
+        self.assertEqual(settings, {"concurrency": 1, "prefetch_multiplier": 1, "queue_worker_settings": {
+            "concurrency": 1, "prefetch_multiplier": 1}})
+        self.assertEqual(conf, QUEUE_WORKER_SETTINGS[STAN_LARGE])
+
+    def test_given_settings_are_kept(self):
+        settings, _ = self.configure(["-Q", STAN_LARGE, "--prefetch-multiplier", "8", "-c", "3"])
+        self.assertEqual((settings["concurrency"], settings["prefetch_multiplier"]), (3, 8))
+
+    def test_several_queues_are_left_alone(self):
+        settings, _ = self.configure(["-Q", f"{STAN_LARGE},dgp-small"])
+        self.assertEqual(settings["prefetch_multiplier"], app.conf.worker_prefetch_multiplier)
+        self.assertNotIn("queue_worker_settings", settings)
+
+    def test_step_is_registered(self):
+        self.assertIn(QueueWorkerSettings, app.steps["worker"])
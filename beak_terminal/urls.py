@@ -16,8 +16,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/dgp/', include('dgp.urls')),
     path('api/stan/', include('stan.urls')),
+    path('api/experiment/', include('experiment.urls')),
+    path('api/metrics/', metrics_view),
 ]
@@ -0,0 +1,57 @@
+"""Corpus sampling benchmark: per-token scipy draws vs. the batched inverse-CDF sampler.
+
+    python -m dgp.lda.benchmark --sample-size 2000 --feature-size 10 --diction-size 1000 --doc-size 100 300
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.stats import dirichlet, randint, multinomial
+
+from .sampler import CategoricalTable, sample_tokens
+
+
+def legacy_omega(theta, phi, Ni):
+    d = [np.argmax(multinomial.rvs(1, theta[i], Ni[i]), axis=1) for i in range(len(Ni))]
+    return [[np.argmax(multinomial.rvs(1, phi[dij])) for dij in di] for di in d]
+
+
+def batched_omega(theta, phi, Ni):
+    words, _ = sample_tokens(theta, CategoricalTable(phi), Ni, np.random.random)
+    return [doc.tolist() for doc in np.split(words, np.cumsum(Ni)[:-1])]
+
+
+def word_frequency_gap(omega, theta, phi, Ni):
+    # total variation distance between the empirical word frequencies and their expectation
+    counts = np.bincount(np.concatenate([np.asarray(doc, dtype=int) for doc in omega]), minlength=phi.shape[1])
+    expected = (Ni @ theta) @ phi
+    return 0.5 * np.abs(counts / counts.sum() - expected / expected.sum()).sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sample-size", type=int, default=2000)
+    parser.add_argument("--feature-size", type=int, default=10)
+    parser.add_argument("--diction-size", type=int, default=1000)
+    parser.add_argument("--doc-size", type=int, nargs=2, default=(100, 300), metavar=("LOWER", "UPPER"))
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    np.random.seed(args.seed)
+    theta = dirichlet.rvs(np.ones(args.feature_size), args.sample_size)
+    phi = dirichlet.rvs(np.ones(args.diction_size), args.feature_size)
+    Ni = randint.rvs(low=args.doc_size[0], high=args.doc_size[1] + 1, size=args.sample_size)
+    print(f"{args.sample_size} docs, {int(Ni.sum())} tokens, K={args.feature_size}, V={args.diction_size}")
+
+    timings = {}
+    for name, func in (("legacy", legacy_omega), ("batched", batched_omega)):
+        start_time = time.time()
+        omega = func(theta, phi, Ni)
+        timings[name] = time.time() - start_time
+        assert [len(doc) for doc in omega] == Ni.tolist(), f"{name}: document sizes differ from Ni"
+        print(f"{name:>8}: {timings[name]:10.3f}s  word frequency TV gap {word_frequency_gap(omega, theta, phi, Ni):.4f}")
+    print(f" speedup: {timings['legacy'] / timings['batched']:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
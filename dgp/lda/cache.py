@@ -0,0 +1,67 @@
+import os
+import shutil
+
+from ..models import LDA
+from .storage import CORPUS_COLUMNS, has_columns
+
+# Executor stages that can be taken from another columnar dataset: stage key field, columns holding it
+STAGES = {
+    "corpus": ("corpus_hash", CORPUS_COLUMNS),
+    "H": ("h_hash", ("H",)),
+    "Z": ("z_hash", ("Z",)),
+    "S": ("s_hash", ("S",)),
+}
+
+
+def find_cached(lda_obj):
+    # latest successful dataset generated from the same parameters whose artifact is still on disk
+    candidates = LDA.objects.filter(param_hash=lda_obj.get_param_hash(), task_status=LDA.TaskStatus.SUC) \
+        .exclude(id=lda_obj.id).order_by('-timestamp')
+    for candidate in candidates:
+        if candidate.data_file_path and os.path.exists(candidate.data_file_path):
+            return candidate
+    return None
+
+
+def link_artifact(source_path, target_path):
+    # hardlink every file of the dataset (a columnar directory, or a csv and its corpus sidecar)
+    if os.path.isdir(source_path):
+        shutil.rmtree(target_path, ignore_errors=True)
+        os.makedirs(target_path)
+        for name in os.listdir(source_path):
+            os.link(os.path.join(source_path, name), os.path.join(target_path, name))
+    else:
+        source_base, target_base = os.path.splitext(source_path)[0], os.path.splitext(target_path)[0]
+        for suffix in (os.path.splitext(source_path)[1], "-omega.npz"):
+            if os.path.exists(source_base + suffix):
+                if os.path.exists(target_base + suffix):
+                    os.remove(target_base + suffix)
+                os.link(source_base + suffix, target_base + suffix)
+
+
+def reuse(lda_obj, source):
+    # Point lda_obj at source's dataset: hardlinked to its own path when possible, otherwise by
+    # reference to source's path (e.g. across file systems).
+    target_path = lda_obj.get_data_file_path()
+    try:
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        link_artifact(source.data_file_path, target_path)
+        lda_obj.data_file_path = target_path
+    except OSError:
+        lda_obj.data_file_path = source.data_file_path
+    lda_obj.source = source
+    lda_obj.true_ate = source.true_ate
+    lda_obj.real_unobservable_rate = source.real_unobservable_rate
+
+
+def find_upstream(lda_obj):
+    # {stage: dataset} of the stages lda_obj can take from existing columnar datasets, preferring its source
+    upstream = {}
+    for stage, (hash_field, columns) in STAGES.items():
+        candidates = LDA.objects.filter(**{hash_field: getattr(lda_obj, hash_field)}, task_status=LDA.TaskStatus.SUC,
+                                        data_format=LDA.DataFormat.COL).exclude(id=lda_obj.id).order_by('-timestamp')
+        for candidate in sorted(candidates, key=lambda candidate: candidate.id != lda_obj.source_id):
+            if candidate.data_file_path and has_columns(candidate.data_file_path, columns):
+                upstream[stage] = candidate
+                break
+    return upstream
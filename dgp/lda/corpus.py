@@ -0,0 +1,53 @@
+import os
+import struct
+import zipfile
+
+import numpy as np
+from scipy import sparse
+
+
+# The corpus omega is a CSR document-term matrix: row i holds the word counts of document i.
+# Counts are stored with the smallest unsigned dtype holding the largest document size, and on disk
+# the word ids with the smallest one holding diction_size (see storage.ColumnarWriter.append_omega).
+def smallest_uint(max_value):
+    return np.min_scalar_type(int(max_value))
+
+
+def build_omega(indptr, indices, counts, diction_size, doc_size_upper_bound):
+    return sparse.csr_matrix((counts.astype(smallest_uint(doc_size_upper_bound)), indices, indptr),
+                             shape=(len(indptr) - 1, diction_size))
+
+
+def get_corpus_file_path(data_file_path):
+    return f"{os.path.splitext(data_file_path)[0]}-omega.npz"
+
+
+def load_omega(path):
+    with np.load(path) as f:
+        return sparse.csr_matrix((f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"]))
+
+
+def open_omega_columns(path):
+    # The CSR arrays of an npz corpus under the columnar column names (see storage.read_omega_rows), as
+    # read-only memory maps: np.savez stores each array uncompressed, as a .npy file at an offset of the zip.
+    columns = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as raw:
+        for name, key in (("omega_offsets", "indptr"), ("omega_indices", "indices"), ("omega_counts", "data")):
+            info = archive.getinfo(f"{key}.npy")
+            assert info.compress_type == zipfile.ZIP_STORED, f"corpus reading: {key} of {path} is compressed"
+            # the member's data follows its local header, whose name and extra field lengths may differ
+            # from the central directory's
+            raw.seek(info.header_offset)
+            name_length, extra_length = struct.unpack("<HH", raw.read(30)[26:30])
+            raw.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(raw)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(raw)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(raw)
+            if 0 in shape:
+                columns[name] = np.empty(shape, dtype=dtype)
+            else:
+                columns[name] = np.memmap(path, dtype=dtype, mode="r", offset=raw.tell(), shape=shape,
+                                          order="F" if fortran_order else "C")
+    return columns
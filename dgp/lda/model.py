@@ -1,11 +1,20 @@
-import random
+import logging
+import multiprocessing
+import threading
+import time
 
 import numpy as np
-import pandas as pd
-from scipy.stats import multivariate_normal, dirichlet, randint, multinomial
+from scipy import sparse
 
+from beak_terminal.progress import ProgressReporter
+from beak_terminal.resources import StageMetrics
 from ..models import LDA
+from .cache import find_upstream
+from .corpus import build_omega
+from .sampler import CategoricalTable, sample_token_counts, sample_counts
+from .storage import CORPUS_COLUMNS, ColumnarWriter, CsvWriter, read_columnar, read_omega_rows
 
+logger = logging.getLogger(__name__)
 
 class Methods_H_Generating:
     # Y0/Y1 mean generation result
@@ -23,12 +32,15 @@ class Methods_H_Generating:
 
 
 class Methods_Z_Generating:
+    def __init__(self, rng):
+        self.rng = rng  # numpy Generator shared with the executor
+
     def Get(self, method_str, gen_args):
         if method_str == "normal":
             return self.normal()
 
     def eta(self):
-        return np.vectorize(lambda val: np.random.normal(val, 1))
+        return lambda val: self.rng.normal(val, 1)
 
     def normal(self):
         def func(X, beta, **kwargs):
@@ -40,18 +52,21 @@ class Methods_Z_Generating:
 
 
 class Methods_W_Error:
-    def Get(self, method_str, error_rate=0.0, **kwargs):
+    def __init__(self, rng):
+        self.rng = rng  # numpy Generator shared with the executor
+
+    def Get(self, method_str, gen_args):
         if method_str == "no-err":
             return self.no_err()
         if method_str == "random":
-            return self.bern_random(error_rate)
+            return self.bern_random(gen_args.get("error_rate", 0.0))
 
     def flip_vec(self):
-        def flip(val):
-            assert type(val) == int and (val == 0 or val == 1), "W error generating: invalid value or type of W"
-            return (val + 1) % 2
+        def flip(W):
+            assert np.isin(W, (0, 1)).all(), "W error generating: invalid value of W"
+            return 1 - W
 
-        return np.vectorize(flip)
+        return flip
 
     def no_err(self):
         def func(W, **kwargs):
@@ -63,14 +78,17 @@ class Methods_W_Error:
         assert type(error_rate) is float and 0.0 <= error_rate <= 1.0, "W error generating: invalid error rate value"
 
         def func(W, **kwargs):
-            flip_index = np.random.random(W.shape[0]) < error_rate
-            W[flip_index == 1] = self.flip_vec()(W[flip_index == 1])
+            flip_index = self.rng.random(W.shape[0]) < error_rate
+            W[flip_index] = self.flip_vec()(W[flip_index])
             return W
 
         return func
 
 
 class Methods_S_Generating:
+    def __init__(self, rng):
+        self.rng = rng  # numpy Generator shared with the executor
+
     def Get(self, method_str, gen_args):
         if method_str == "exact":
             if "missing_rate" not in gen_args:
@@ -87,10 +105,10 @@ class Methods_S_Generating:
 
         def func(sample_size, **kwargs):
             missing_num = int(np.floor(sample_size * missing_rate))
-            missing_indices = np.array(random.sample(range(sample_size), missing_num))
-            s = np.ones(sample_size)
+            missing_indices = self.rng.choice(sample_size, missing_num, replace=False)
+            s = np.ones(sample_size, dtype=int)
             s[missing_indices] = 0
-            return np.array(s, dtype=int)
+            return s
 
         return func
 
@@ -98,22 +116,67 @@ class Methods_S_Generating:
         assert type(missing_rate) is float and 0.0 <= missing_rate <= 1.0, "S generating: invalid missing rate value"
 
         def func(sample_size, **kwargs):
-            return np.array(np.random.random(sample_size) > missing_rate, dtype=int)
+            return np.array(self.rng.random(sample_size) > missing_rate, dtype=int)
 
         return func
 
 
+# executor being run by a fork-started generation pool; pool workers inherit it instead of unpickling it
+_forked_executor = None
+
+
+def _generate_forked_block(index):
+    # the stages measured in the pool worker travel back with the block
+    _forked_executor.metrics = StageMetrics()
+    block = _forked_executor.generate_block(index)
+    return block, _forked_executor.metrics.as_list()
+
+
 class Executor:
+    # All randomness comes from rng, the numpy Generator shared with the Methods_* kernels.
+    # Documents are generated block by block, and each stage draws from its own stream:
+    # SeedSequence(random_seed, spawn_key=(stream,)) for the dataset-wide draws (phi, S) and
+    # SeedSequence(random_seed, spawn_key=(stream, block index)) inside a block. A run is therefore fully
+    # determined by its seed and block size, whatever the order or process the blocks are generated in,
+    # and a stage can be taken from an upstream dataset (a columnar dataset path per stage in upstream)
+    # without changing any other stage's draws.
+    # With workers > 1 blocks are generated by a fork-started process pool and collected in order; where
+    # a pool cannot be forked safely (a daemonic or a non-main thread worker) they are generated serially.
+    # With streaming, each block is written out and released as soon as it arrives and peak memory is set
+    # by block_size; otherwise each block is copied into the dataset-wide arrays and released, and the
+    # dataset is written at the end, by a background thread with background_save so the caller can go on
+    # with the arrays (see arrays() and wait()).
+    # Every stage is measured in metrics (time, peak memory, documents) and summed over the blocks.
+    CORPUS_STREAM, H_STREAM, Z_STREAM, S_STREAM, W_STREAM = range(5)
+    STAGES = ("corpus", "H", "Z", "S")
+    DENSE_COLUMNS = ("X", "H", "Z", "W", "Y", "W_true")
+
     def __init__(self, sample_size, feature_size, diction_size, doc_size_lower_bound, doc_size_upper_bound,
                  alpha, gamma_null, beta0, beta1, betaW, wz_threshold, h_covariance, data_file_path,
-                 H_generating_func, S_generating_func, W_error_flip_func, Z_generating_func, random_seed):
+                 H_generating_func, S_generating_func, W_error_flip_func, Z_generating_func, random_seed,
+                 corpus_gen_method=LDA.CorpusGenMethod.TOK, data_format=LDA.DataFormat.COL,
+                 block_size=10000, streaming=False, workers=1, rng=None, upstream=None, background_save=False,
+                 progress=None):
         self.random_seed = random_seed
+        self.rng = rng if rng is not None else np.random.default_rng(random_seed)
         self.data_file_path = data_file_path
+        self.data_format = data_format
         self.sample_size = sample_size
         self.feature_size = feature_size
         self.diction_size = diction_size
         self.doc_size_lower_bound = doc_size_lower_bound
         self.doc_size_upper_bound = doc_size_upper_bound
+        self.corpus_gen_method = corpus_gen_method
+        self.block_size = block_size
+        self.streaming = streaming
+        self.workers = workers
+        self.upstream = upstream or {}
+        self.background_save = background_save
+        self.progress = progress or (lambda stage, done=None, total=None: None)  # (stage, done, total) reports
+        self.writer_thread = None
+        self.writer_error = None
+        self.save_time = None
+        self.metrics = StageMetrics()
 
         self.alpha = alpha
         self.gamma_null = gamma_null
@@ -130,70 +193,268 @@ class Executor:
 
         self.real_missing_rate = None
 
+        self.phi = None
+        self.X_sum = np.zeros(feature_size)
+        self.upstream_columns = {}
+        self.linked = ()  # block entries whose columns are hardlinked from the upstream corpus instead of written
+
+        # current block, or the whole dataset after a non-streaming run (S always covers the whole dataset)
         self.X = None
         self.H = None
+        self.Z = None
+        self.S = None
         self.W = None
         self.Y = None
         self.W_true = None
-        self.omega = None
+        self.omega = None  # CSR document-term count matrix
 
     @property
     def ATE(self):
         # beta1 - beta0
-        return (self.beta1 - self.beta0) @ np.average(self.X, axis=0)
+        return (self.beta1 - self.beta0) @ (self.X_sum / self.sample_size)
 
     @property
     def REAL_MISSING_RATE(self):
         return self.real_missing_rate
 
-    def X_omega_Generating(self):
-        theta = dirichlet.rvs(self.alpha, self.sample_size)
-        phi = dirichlet.rvs(self.gamma_null, self.diction_size)
-        Ni = randint.rvs(low=self.doc_size_lower_bound,
-                         high=self.doc_size_upper_bound + 1,
-                         size=self.sample_size)
-        d = [np.argmax(multinomial.rvs(1, theta[i], Ni[i]), axis=1) for i in range(self.sample_size)]
-        omega = [[np.argmax(multinomial.rvs(1, phi[dij])) for dij in di] for di in d]
+    def block_range(self, index):
+        start = index * self.block_size
+        return start, min(start + self.block_size, self.sample_size)
+
+    def block_count(self):
+        return -(-self.sample_size // self.block_size)
+
+    def reseed(self, *spawn_key):
+        # the Generator is shared with the Methods_* kernels, so its state is replaced in place
+        seed_sequence = np.random.SeedSequence(self.random_seed, spawn_key=spawn_key)
+        self.rng.bit_generator.state = type(self.rng.bit_generator)(seed_sequence).state
+
+    def open_upstream(self):
+        for stage, path in self.upstream.items():
+            assert stage in self.STAGES, f"stage reusing: invalid stage {stage}"
+            self.upstream_columns[stage], _ = read_columnar(path)
+
+    def phi_Generating(self):
+        self.phi = self.rng.dirichlet(self.gamma_null, self.feature_size)  # one word distribution per topic
+
+    def S_Generating(self):
+        # S is drawn for the whole dataset up front, since methods like exact missing count are global
+        self.S = self.S_generating_func(sample_size=self.sample_size)  # S==0 -> missing; S==1 -> observed
+
+    def X_omega_Generating(self, start, end):
+        theta = self.rng.dirichlet(self.alpha, end - start)
+        Ni = self.rng.integers(low=self.doc_size_lower_bound,
+                               high=self.doc_size_upper_bound + 1,
+                               size=end - start)
+        if self.corpus_gen_method == LDA.CorpusGenMethod.CNT:
+            csr = sample_counts(theta, self.phi, Ni, self.rng.multinomial)
+        elif self.corpus_gen_method == LDA.CorpusGenMethod.TOK:
+            csr = sample_token_counts(theta, CategoricalTable(self.phi), Ni, self.rng.random)
+        else:
+            raise RuntimeError(f"corpus generating: invalid corpus gen method {self.corpus_gen_method}")
         self.X = theta
-        self.omega = omega
+        self.omega = build_omega(*csr, diction_size=self.diction_size, doc_size_upper_bound=self.doc_size_upper_bound)
 
-    def Y1_Y0_Generating(self):
+    def Y1_Y0_Generating(self, start, end):
         beta = np.array([self.beta1, self.beta0])  # [beta1, beta0]
         cov = np.array(self.h_covariance)
-        self.H = np.apply_along_axis(lambda h_i: multivariate_normal.rvs(h_i, cov), axis=1,
-                                     arr=self.H_generating_func(self.X, beta))
-
-    def W_Generating(self):
-        Z = self.Z_generating_func(X=self.X, beta=self.betaW)
-        self.W_true = np.array(Z > self.wz_threshold, dtype=int)
-        S = self.S_generating_func(sample_size=self.sample_size, X=self.X, Z=Z)  # S==0 -> missing; S==1 -> observed
-        self.real_missing_rate = 1 - np.average(S)
-        self.W = self.W_error_flip_func(W=self.W_true.copy(), X=self.X, Z=Z, S=S)
+        H_mean = self.H_generating_func(self.X, beta)
+        self.H = H_mean + self.rng.multivariate_normal(np.zeros(cov.shape[0]), cov, size=H_mean.shape[0], method="cholesky")
+
+    def Z_Generating(self, start, end):
+        self.Z = self.Z_generating_func(X=self.X, beta=self.betaW)
+
+    def W_Generating(self, start, end):
+        self.W_true = np.array(self.Z > self.wz_threshold, dtype=int)
+        S = self.S[start:end]
+        self.W = self.W_error_flip_func(W=self.W_true.copy(), X=self.X, Z=self.Z, S=S)
         self.W[S == 0] = -1
 
-    def Y_Generating(self):
+    def Y_Generating(self, start, end):
         self.Y = np.array(self.H[:, 0] * self.W_true + self.H[:, 1] * (1 - self.W_true))
 
-    def to_csv(self):
-        df = pd.DataFrame(data=self.X, columns=[f'X{i}' for i in range(self.X.shape[1])])
-        df['Y'] = self.Y
-        df['W'] = self.W
-        df['W_true'] = self.W_true
-        df['omega'] = [str(omega) for omega in self.omega]
-        df.to_csv(self.data_file_path)
+    def open_writer(self):
+        if self.data_format == LDA.DataFormat.CSV:
+            return CsvWriter(self.data_file_path)
+        elif self.data_format == LDA.DataFormat.COL:
+            writer = ColumnarWriter(self.data_file_path)
+            if "corpus" in self.upstream:
+                writer.link(self.upstream["corpus"], CORPUS_COLUMNS)
+                self.linked = ("X", "omega")
+            return writer
+        raise RuntimeError(f"dataset saving: invalid data format {self.data_format}")
+
+    def write_block(self, writer, block):
+        writer.append_block(**{name: None if name in self.linked else value for name, value in block.items()})
+
+    def save(self, memory=True):
+        self.progress("saving")
+        with self.metrics.stage("save", items=self.sample_size, memory=memory):
+            writer = self.open_writer()
+            self.write_block(writer, self.block())
+            writer.close(sample_size=self.sample_size, feature_size=self.feature_size,
+                         diction_size=self.diction_size)
+
+    def block(self, start=0, end=None):
+        return {"X": self.X, "H": self.H, "Z": self.Z, "S": self.S[start:end], "W": self.W, "W_true": self.W_true,
+                "Y": self.Y, "omega": self.omega}
+
+    def generate_block(self, index):
+        start, end = self.block_range(index)
+        columns = self.upstream_columns
+        with self.metrics.stage("corpus", items=end - start):
+            if "corpus" in columns:
+                self.X = np.array(columns["corpus"]["X"][start:end])
+                self.omega = read_omega_rows(columns["corpus"], start, end, self.diction_size)
+            else:
+                self.reseed(self.CORPUS_STREAM, index)
+                self.X_omega_Generating(start, end)
+        with self.metrics.stage("H", items=end - start):
+            if "H" in columns:
+                self.H = np.array(columns["H"]["H"][start:end])
+            else:
+                self.reseed(self.H_STREAM, index)
+                self.Y1_Y0_Generating(start, end)
+        with self.metrics.stage("Z", items=end - start):
+            if "Z" in columns:
+                self.Z = np.array(columns["Z"]["Z"][start:end])
+            else:
+                self.reseed(self.Z_STREAM, index)
+                self.Z_Generating(start, end)
+        with self.metrics.stage("W", items=end - start):
+            self.reseed(self.W_STREAM, index)
+            self.W_Generating(start, end)
+        with self.metrics.stage("Y", items=end - start):
+            self.Y_Generating(start, end)
+        return self.block(start, end)
+
+    def can_fork(self):
+        # daemonic processes (celery prefork children) cannot have children, and a task running on a pool
+        # thread (celery threads pool) would fork while the other tasks' threads may hold locks
+        return not multiprocessing.current_process().daemon and threading.current_thread() is threading.main_thread()
+
+    def generated_blocks(self):
+        if self.workers > 1 and not self.can_fork():
+            logger.warning("parallel generating: cannot fork a process pool here, generating %d blocks serially; "
+                           "run the worker with --pool=solo for parallel generation", self.block_count())
+        if self.workers <= 1 or not self.can_fork():
+            yield from map(self.generate_block, range(self.block_count()))
+            return
+        global _forked_executor
+        _forked_executor = self
+        try:
+            with multiprocessing.get_context("fork").Pool(self.workers) as pool:
+                for block, stages in pool.imap(_generate_forked_block, range(self.block_count())):
+                    self.metrics.merge(stages)
+                    yield block
+        finally:
+            _forked_executor = None
 
     def __call__(self):
-        random.seed(self.random_seed)
-        np.random.seed(self.random_seed)
-        self.X_omega_Generating()
-        self.Y1_Y0_Generating()
-        self.W_Generating()
-        self.Y_Generating()
-        self.to_csv()
-
-
-def run(id):
+        with self.metrics.stage("upstream", items=len(self.upstream)):
+            self.open_upstream()
+        if "corpus" not in self.upstream:
+            with self.metrics.stage("phi", items=self.feature_size):
+                self.reseed(self.CORPUS_STREAM)
+                self.phi_Generating()
+        with self.metrics.stage("S", items=self.sample_size):
+            if "S" in self.upstream:
+                self.S = np.array(self.upstream_columns["S"]["S"], dtype=int)
+            else:
+                self.reseed(self.S_STREAM)
+                self.S_Generating()
+        self.real_missing_rate = 1 - np.average(self.S)
+
+        if self.streaming:
+            writer = self.open_writer()
+            for block in self.counted_blocks():
+                with self.metrics.stage("save", items=len(block["X"])):
+                    self.write_block(writer, block)
+            self.X = self.H = self.Z = self.W = self.Y = self.W_true = self.omega = None
+            with self.metrics.stage("save"):
+                writer.close(sample_size=self.sample_size, feature_size=self.feature_size,
+                             diction_size=self.diction_size)
+        else:
+            columns, omega_parts = {}, []
+            start = 0
+            for block in self.counted_blocks():
+                with self.metrics.stage("assemble", items=len(block["X"])):
+                    self.keep_block(columns, omega_parts, start, block)
+                start += len(block["X"])
+            for name, column in columns.items():
+                setattr(self, name, column)
+            with self.metrics.stage("assemble"):
+                self.omega = self.assemble_omega(omega_parts)
+            if self.background_save:
+                self.writer_thread = threading.Thread(target=self.save_in_background, name="dgp-lda-writer")
+                self.writer_thread.start()
+            else:
+                self.save()
+
+    def counted_blocks(self):
+        # generated blocks, counted into X_sum and the progress reports
+        done = 0
+        self.progress("generating", done, self.sample_size)
+        for block in self.generated_blocks():
+            self.X_sum += block["X"].sum(axis=0)
+            yield block
+            done += len(block["X"])
+            self.progress("generating", done, self.sample_size)
+
+    def keep_block(self, columns, omega_parts, start, block):
+        # copy a block into the dataset-wide columns, allocated on the first block; the corpus rows are kept
+        # until all blocks are in and the size of the whole corpus is known
+        end = start + len(block["X"])
+        for name in self.DENSE_COLUMNS:
+            if name not in columns:
+                columns[name] = np.empty((self.sample_size,) + block[name].shape[1:], dtype=block[name].dtype)
+            columns[name][start:end] = block[name]
+        omega_parts.append(block["omega"])
+
+    def assemble_omega(self, omega_parts):
+        # the corpus blocks as one CSR matrix, each block released as soon as it is copied in, so the
+        # corpus is never held twice
+        nnz = sum(part.nnz for part in omega_parts)
+        index_dtype = np.int32 if max(nnz, self.diction_size) < np.iinfo(np.int32).max else np.int64
+        indptr = np.zeros(self.sample_size + 1, dtype=index_dtype)
+        indices = np.empty(nnz, dtype=index_dtype)
+        data = np.empty(nnz, dtype=omega_parts[0].data.dtype)
+        row = offset = 0
+        while omega_parts:
+            part = omega_parts.pop(0)
+            indptr[row + 1:row + part.shape[0] + 1] = part.indptr[1:] + offset
+            indices[offset:offset + part.nnz] = part.indices
+            data[offset:offset + part.nnz] = part.data
+            row, offset = row + part.shape[0], offset + part.nnz
+        return sparse.csr_matrix((data, indices, indptr), shape=(self.sample_size, self.diction_size))
+
+    def save_in_background(self):
+        start_time = time.time()
+        try:
+            self.save(memory=False)
+        except Exception as e:
+            self.writer_error = e
+        self.save_time = time.time() - start_time
+
+    def wait(self):
+        # block until a background save is done, raising its error if it failed
+        if self.writer_thread is not None:
+            self.writer_thread.join()
+            self.writer_thread = None
+        if self.writer_error is not None:
+            raise self.writer_error
+
+    def arrays(self):
+        # the generated dataset as the estimation loaders take it; None after a streaming run released it
+        if self.X is None:
+            return None
+        return {"X": self.X, "W": self.W, "Y": self.Y, "omega": self.omega}
+
+
+def run(id, background_save=False):
     lda_obj = LDA.objects.filter(id=id).first()
+    rng = np.random.default_rng(lda_obj.random_seed)
+    upstream = find_upstream(lda_obj)
 
     executor = Executor(
         sample_size=lda_obj.sample_size,
@@ -201,6 +462,11 @@ def run(id):
         diction_size=lda_obj.diction_size,
         doc_size_lower_bound=lda_obj.doc_size_lower_bound,
         doc_size_upper_bound=lda_obj.doc_size_upper_bound,
+        corpus_gen_method=lda_obj.corpus_gen_method,
+        data_format=lda_obj.data_format,
+        block_size=lda_obj.block_size,
+        streaming=lda_obj.streaming,
+        workers=lda_obj.workers,
         alpha=np.array(lda_obj.alpha),
         gamma_null=np.array(lda_obj.gamma_null),
         beta0=np.array(lda_obj.beta0),
@@ -210,13 +476,20 @@ def run(id):
         h_covariance=lda_obj.h_covariance,
         data_file_path=lda_obj.data_file_path,
         random_seed=lda_obj.random_seed,
+        rng=rng,
+        upstream={stage: source.data_file_path for stage, source in upstream.items()},
+        background_save=background_save,
+        progress=ProgressReporter("dgp", id),
         H_generating_func=Methods_H_Generating().Get(method_str=lda_obj.h_gen_method, gen_args=lda_obj.h_gen_args),
-        S_generating_func=Methods_S_Generating().Get(method_str=lda_obj.s_gen_method, gen_args=lda_obj.s_gen_args),
-        Z_generating_func=Methods_Z_Generating().Get(method_str=lda_obj.z_gen_method, gen_args=lda_obj.z_gen_args),
-        W_error_flip_func=Methods_W_Error().Get(method_str=lda_obj.w_err_method, gen_args=lda_obj.w_err_args),
+        S_generating_func=Methods_S_Generating(rng).Get(method_str=lda_obj.s_gen_method, gen_args=lda_obj.s_gen_args),
+        Z_generating_func=Methods_Z_Generating(rng).Get(method_str=lda_obj.z_gen_method, gen_args=lda_obj.z_gen_args),
+        W_error_flip_func=Methods_W_Error(rng).Get(method_str=lda_obj.w_err_method, gen_args=lda_obj.w_err_args),
     )
     executor()
     lda_obj.true_ate = executor.ATE
     lda_obj.real_unobservable_rate = executor.real_missing_rate
+    lda_obj.reused_stages = {stage: source.id for stage, source in upstream.items()}
+    lda_obj.stage_metrics = executor.metrics.as_list()
 
     lda_obj.save()
+    return executor
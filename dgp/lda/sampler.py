@@ -0,0 +1,98 @@
+import numpy as np
+
+
+class CategoricalTable:
+    # A stack of categorical distributions (one per row of p) sampled by inverse CDF.
+    # Row r's CDF is shifted by r, so the flattened table is non-decreasing and a whole batch of draws
+    # from arbitrary rows is a single searchsorted call.
+    def __init__(self, p):
+        p = np.asarray(p, dtype=float)
+        assert p.ndim == 2, f"categorical table: probabilities must be 2-dim, got {p.shape}"
+        cdf = np.cumsum(p, axis=1)
+        cdf /= cdf[:, -1:]
+        cdf[:, -1] = 1.0  # round-off in cumsum must never leave a uniform draw past the last category
+        self.n_rows, self.n_cats = cdf.shape
+        self.flat = (cdf + np.arange(self.n_rows)[:, None]).ravel()
+
+    def sample(self, rows, u):
+        # one category for each entry of rows, drawn from p[rows[j]] with the uniform u[j]
+        idx = np.searchsorted(self.flat, u + rows, side="right") - rows * self.n_cats
+        return np.minimum(idx, self.n_cats - 1)
+
+
+def token_blocks(Ni, max_tokens):
+    # split documents into consecutive [start, end) ranges holding at most max_tokens tokens each
+    # (a single document longer than max_tokens is a block on its own)
+    ends = np.cumsum(Ni)
+    start = 0
+    while start < len(Ni):
+        base = ends[start - 1] if start > 0 else 0
+        end = max(int(np.searchsorted(ends, base + max_tokens, side="right")), start + 1)
+        yield start, end
+        start = end
+
+
+def sample_tokens(theta, phi_table, Ni, random, max_tokens=1 << 22):
+    # Draw topic and word assignments of every token of the documents in theta.
+    # Tokens come out document by document in the same order as per-document sampling; for each token
+    # the first uniform picks its topic from theta and the second its word from phi.
+    words = np.empty(int(np.sum(Ni)), dtype=int)
+    topics = np.empty_like(words)
+    offset = 0
+    for start, end in token_blocks(Ni, max_tokens):
+        doc = np.repeat(np.arange(end - start), Ni[start:end])
+        topic = CategoricalTable(theta[start:end]).sample(doc, random(doc.size))
+        words[offset:offset + doc.size] = phi_table.sample(topic, random(doc.size))
+        topics[offset:offset + doc.size] = topic
+        offset += doc.size
+    return words, topics
+
+
+def count_tokens(doc, words, n_docs, n_words):
+    # CSR arrays (indptr, indices, counts) of the per-document word counts of a token stream
+    keys, counts = np.unique(doc * n_words + words, return_counts=True)
+    indptr = np.zeros(n_docs + 1, dtype=int)
+    np.cumsum(np.bincount(keys // n_words, minlength=n_docs), out=indptr[1:])
+    return indptr, keys % n_words, counts
+
+
+def concat_csr(blocks):
+    # stack CSR arrays of consecutive document blocks
+    indptr, indices, counts = [np.zeros(1, dtype=int)], [], []
+    for block_indptr, block_indices, block_counts in blocks:
+        indptr.append(block_indptr[1:] + indptr[-1][-1])
+        indices.append(block_indices)
+        counts.append(block_counts)
+    return np.concatenate(indptr), np.concatenate(indices), np.concatenate(counts)
+
+
+def sample_token_counts(theta, phi_table, Ni, random, max_tokens=1 << 22):
+    # Same draws as sample_tokens, reduced block by block to CSR arrays of per-document word counts
+    # so the full token stream is never held in memory.
+    def blocks():
+        for start, end in token_blocks(Ni, max_tokens):
+            doc = np.repeat(np.arange(end - start), Ni[start:end])
+            topic = CategoricalTable(theta[start:end]).sample(doc, random(doc.size))
+            words = phi_table.sample(topic, random(doc.size))
+            yield count_tokens(doc, words, end - start, phi_table.n_cats)
+
+    return concat_csr(blocks())
+
+
+def sample_counts(theta, phi, Ni, multinomial, max_cells=1 << 22):
+    # Draw each document's bag of words directly as multinomial(N_i, theta_i @ phi); the cost is one
+    # length-V draw per document, independent of the number of tokens. multinomial is a numpy
+    # Generator's, which draws a whole block of documents at once. Returns CSR arrays
+    # (indptr, indices, counts) holding the nonzero word counts of every document.
+    block_size = max(1, max_cells // phi.shape[1])
+    blocks = []
+    for start in range(0, len(Ni), block_size):
+        end = min(start + block_size, len(Ni))
+        p = theta[start:end] @ phi
+        p /= p.sum(axis=1, keepdims=True)
+        doc_counts = multinomial(Ni[start:end], p)
+        doc, words = np.nonzero(doc_counts)
+        indptr = np.zeros(end - start + 1, dtype=int)
+        np.cumsum(np.bincount(doc, minlength=end - start), out=indptr[1:])
+        blocks.append((indptr, words, doc_counts[doc, words]))
+    return concat_csr(blocks)
@@ -0,0 +1,135 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .corpus import get_corpus_file_path
+
+# Columnar dataset layout: a directory holding one raw little-endian binary file per column plus
+# meta.json describing each column's dtype and shape. The ragged corpus is stored CSR style as
+# omega_offsets (document start offsets, length sample_size + 1), omega_indices (word ids) and
+# omega_counts. Columns are loaded as read-only memory maps, so opening a dataset copies nothing.
+COLUMNAR_FORMAT = "beak-columnar"
+COLUMNAR_VERSION = 1
+META_FILE = "meta.json"
+# columns making up the corpus stage: the topic mixtures and the CSR document-term counts
+CORPUS_COLUMNS = ("X", "omega_offsets", "omega_indices", "omega_counts")
+# 0/1/-1 columns stored as int8
+SMALL_INT_COLUMNS = ("W", "W_true", "S")
+
+
+class ColumnarWriter:
+    def __init__(self, path):
+        self.path = path
+        self.columns = {}
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.endswith(".bin") or name == META_FILE:
+                os.remove(os.path.join(path, name))
+
+    def append(self, name, arr):
+        # append rows to a column, creating it on first use
+        arr = np.ascontiguousarray(arr)
+        arr = arr.astype(arr.dtype.newbyteorder("<"), copy=False)
+        if name not in self.columns:
+            self.columns[name] = {"dtype": arr.dtype.str, "shape": [0] + list(arr.shape[1:])}
+        column = self.columns[name]
+        assert column["dtype"] == arr.dtype.str and column["shape"][1:] == list(arr.shape[1:]), \
+            f"columnar writing: column {name} got {arr.dtype.str} {arr.shape}, expected {column['dtype']} {column['shape']}"
+        with open(os.path.join(self.path, f"{name}.bin"), "ab") as f:
+            f.write(arr.tobytes())
+        column["shape"][0] += arr.shape[0]
+
+    def append_omega(self, omega):
+        # append CSR document rows; offsets are shifted to continue after the rows already written
+        nnz = self.columns["omega_indices"]["shape"][0] if "omega_indices" in self.columns else 0
+        offsets = omega.indptr.astype(np.int64)
+        self.append("omega_offsets", offsets if "omega_offsets" not in self.columns else offsets[1:] + nnz)
+        self.append("omega_indices", omega.indices.astype(np.min_scalar_type(max(omega.shape[1] - 1, 0))))
+        self.append("omega_counts", omega.data)
+
+    def append_block(self, omega=None, **columns):
+        # append one block of rows to every given column; None skips a column (e.g. a linked one)
+        for name, arr in columns.items():
+            if arr is not None:
+                self.append(name, arr.astype(np.int8) if name in SMALL_INT_COLUMNS else arr)
+        if omega is not None:
+            self.append_omega(omega)
+
+    def link(self, source_path, names):
+        # hardlink whole columns of another columnar dataset instead of writing them
+        with open(os.path.join(source_path, META_FILE)) as f:
+            source_columns = json.load(f)["columns"]
+        for name in names:
+            os.link(os.path.join(source_path, f"{name}.bin"), os.path.join(self.path, f"{name}.bin"))
+            self.columns[name] = source_columns[name]
+
+    def close(self, **attrs):
+        with open(os.path.join(self.path, META_FILE), "w") as f:
+            json.dump({"format": COLUMNAR_FORMAT, "version": COLUMNAR_VERSION, "columns": self.columns, **attrs}, f)
+
+
+class CsvWriter:
+    # CSV export: X, Y, W and W_true rows go to the CSV, the corpus to the <name>-omega.npz sidecar.
+    # Corpus blocks are staged in a columnar directory and copied into the npz chunk by chunk on close.
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.corpus = ColumnarWriter(f"{os.path.splitext(path)[0]}-omega.parts")
+
+    def append_block(self, X, Y, W, W_true, omega, **intermediates):
+        df = pd.DataFrame(data=X, columns=[f'X{i}' for i in range(X.shape[1])],
+                          index=pd.RangeIndex(self.rows, self.rows + X.shape[0]))
+        df['Y'] = Y
+        df['W'] = W
+        df['W_true'] = W_true
+        df.to_csv(self.path, mode="a" if self.rows else "w", header=not self.rows)
+        self.rows += X.shape[0]
+        self.corpus.append_omega(omega)
+
+    def close(self, **attrs):
+        self.corpus.close()
+        columns, _ = read_columnar(self.corpus.path)
+        np.savez(get_corpus_file_path(self.path),
+                 shape=np.array([self.rows, attrs["diction_size"]]),
+                 indptr=columns["omega_offsets"],
+                 indices=columns["omega_indices"],
+                 data=columns["omega_counts"])
+        del columns
+        shutil.rmtree(self.corpus.path)
+
+
+def read_columnar(path):
+    # columns of a dataset as read-only memory maps, plus its meta information
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    assert meta.get("format") == COLUMNAR_FORMAT, f"columnar reading: {path} is not a {COLUMNAR_FORMAT} dataset"
+    columns = {}
+    for name, column in meta["columns"].items():
+        shape = tuple(column["shape"])
+        if 0 in shape:
+            columns[name] = np.empty(shape, dtype=column["dtype"])
+        else:
+            columns[name] = np.memmap(os.path.join(path, f"{name}.bin"), dtype=column["dtype"], mode="r", shape=shape)
+    return columns, meta
+
+
+def has_columns(path, names):
+    try:
+        with open(os.path.join(path, META_FILE)) as f:
+            columns = json.load(f)["columns"]
+    except (OSError, ValueError, KeyError):
+        return False
+    return all(name in columns and os.path.exists(os.path.join(path, f"{name}.bin")) for name in names)
+
+
+def read_omega_rows(columns, start, end, diction_size):
+    # CSR matrix of documents [start, end) of a columnar corpus
+    offsets = np.asarray(columns["omega_offsets"][start:end + 1])
+    return sparse.csr_matrix((np.asarray(columns["omega_counts"][offsets[0]:offsets[-1]]),
+                              np.asarray(columns["omega_indices"][offsets[0]:offsets[-1]]).astype(np.int32),
+                              offsets - offsets[0]),
+                             shape=(end - start, diction_size))
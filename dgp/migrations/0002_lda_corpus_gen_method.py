@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dgp", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lda",
+            name="corpus_gen_method",
+            field=models.CharField(choices=[("token", "TOKEN"), ("count", "COUNT")], default="token", max_length=16),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dgp", "0002_lda_corpus_gen_method"),
+    ]
+
+    operations = [
+        # existing datasets were all written as csv; only new rows default to columnar
+        migrations.AddField(
+            model_name="lda",
+            name="data_format",
+            field=models.CharField(choices=[("columnar", "COLUMNAR"), ("csv", "CSV")], default="csv", max_length=16),
+        ),
+        migrations.AlterField(
+            model_name="lda",
+            name="data_format",
+            field=models.CharField(choices=[("columnar", "COLUMNAR"), ("csv", "CSV")], default="columnar", max_length=16),
+        ),
+    ]
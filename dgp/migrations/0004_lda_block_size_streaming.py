@@ -0,0 +1,24 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:30
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dgp", "0003_lda_data_format"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lda",
+            name="block_size",
+            field=models.IntegerField(default=10000, validators=[django.core.validators.MinValueValidator(100), django.core.validators.MaxValueValidator(1000000)]),
+        ),
+        migrations.AddField(
+            model_name="lda",
+            name="streaming",
+            field=models.BooleanField(default=False),
+        ),
+    ]
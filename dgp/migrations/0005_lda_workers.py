@@ -0,0 +1,19 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:31
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dgp", "0004_lda_block_size_streaming"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lda",
+            name="workers",
+            field=models.IntegerField(default=1, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(64)]),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dgp", "0005_lda_workers"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lda",
+            name="param_hash",
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="lda",
+            name="source",
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="reused_by", to="dgp.lda"),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dgp", "0006_lda_param_hash_source"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lda",
+            name="corpus_hash",
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="lda",
+            name="h_hash",
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="lda",
+            name="reused_stages",
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name="lda",
+            name="s_hash",
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="lda",
+            name="z_hash",
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 17:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dgp", "0008_lda_peak_memory"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lda",
+            name="stage_metrics",
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
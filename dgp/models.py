@@ -1,9 +1,30 @@
+import hashlib
+import json
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MaxValueValidator, MinValueValidator
 
 
 class LDA(models.Model):
+    # bump whenever Executor changes what a given configuration generates, so old datasets stop matching
+    GENERATOR_VERSION = 2
+    # fields that determine the Executor's output (streaming and workers do not change it)
+    PARAM_HASH_FIELDS = ('random_seed', 'sample_size', 'feature_size', 'diction_size', 'doc_size_lower_bound',
+                         'doc_size_upper_bound', 'alpha', 'gamma_null', 'beta0', 'beta1', 'betaW', 'wz_threshold',
+                         'corpus_gen_method', 'block_size', 'z_gen_method', 'z_gen_args', 's_gen_method',
+                         's_gen_args', 'h_gen_method', 'h_gen_args', 'h_covariance', 'w_err_method', 'w_err_args',
+                         'data_format')
+    # fields each reusable Executor stage depends on, keyed by the hash field storing the stage key
+    CORPUS_HASH_FIELDS = ('random_seed', 'sample_size', 'feature_size', 'diction_size', 'doc_size_lower_bound',
+                          'doc_size_upper_bound', 'alpha', 'gamma_null', 'corpus_gen_method', 'block_size')
+    STAGE_HASH_FIELDS = {
+        'corpus_hash': CORPUS_HASH_FIELDS,
+        'h_hash': CORPUS_HASH_FIELDS + ('beta0', 'beta1', 'h_gen_method', 'h_gen_args', 'h_covariance'),
+        'z_hash': CORPUS_HASH_FIELDS + ('betaW', 'z_gen_method', 'z_gen_args'),
+        's_hash': ('random_seed', 'sample_size', 's_gen_method', 's_gen_args'),
+    }
+
     class TaskStatus(models.TextChoices):
         PEN = "pending", "PENDING"
         RUN = "running", "RUNNING"
@@ -24,6 +45,14 @@ class LDA(models.Model):
     class IntermediateZGenMethod(models.TextChoices):
         NORMAL = "normal", "NORMAL"
 
+    class CorpusGenMethod(models.TextChoices):
+        TOK = "token", "TOKEN"
+        CNT = "count", "COUNT"
+
+    class DataFormat(models.TextChoices):
+        COL = "columnar", "COLUMNAR"
+        CSV = "csv", "CSV"
+
     # operator
     operator_id = models.ForeignKey(User, null=True, on_delete=models.SET_NULL, related_name='dgp_operator_id')
     # operator string (will not be affected even if the user has been deleted)
@@ -56,6 +85,8 @@ class LDA(models.Model):
     # WZ threshold
     wz_threshold = models.IntegerField(default=0, validators=[MinValueValidator(-500), MaxValueValidator(500)])
 
+    # method to generate the corpus: per-token topic/word draws or per-document word counts
+    corpus_gen_method = models.CharField(max_length=16, choices=CorpusGenMethod.choices, default=CorpusGenMethod.TOK)
     # method to generate Z
     z_gen_method = models.CharField(max_length=16, choices=IntermediateZGenMethod.choices, default=IntermediateZGenMethod.NORMAL)
     # args for generating Z
@@ -84,13 +115,72 @@ class LDA(models.Model):
     real_unobservable_rate = models.FloatField(blank=True, null=True)
     # execution time in seconds
     execution_time = models.FloatField(blank=True, null=True)
+    # peak resident memory in MB
+    peak_memory = models.FloatField(blank=True, null=True)
+    # per-stage breakdown: [{"stage", "seconds", "peak_memory", "items", "calls"}] in run order
+    stage_metrics = models.JSONField(default=list, blank=True)
     # err log information
     err_log_info = models.CharField(max_length=1000000, blank=True, null=True)
-    # csv file saving path
+    # documents generated per block; part of the generation, so results depend on it
+    block_size = models.IntegerField(default=10000, validators=[MinValueValidator(100), MaxValueValidator(1000000)])
+    # write each block out as soon as it is generated instead of keeping the whole dataset in memory
+    streaming = models.BooleanField(default=False)
+    # processes generating blocks in parallel; does not change the results
+    workers = models.IntegerField(default=1, validators=[MinValueValidator(1), MaxValueValidator(64)])
+    # dataset storage format
+    data_format = models.CharField(max_length=16, choices=DataFormat.choices, default=DataFormat.COL)
+    # dataset saving path (a directory for columnar datasets, a file for csv datasets)
     data_file_path = models.CharField(max_length=4096, blank=True, null=True)
+    # canonical hash of PARAM_HASH_FIELDS; identical configurations share one dataset
+    param_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+    # stage keys: hashes of STAGE_HASH_FIELDS; datasets with the same key share that stage's output
+    corpus_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+    h_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+    z_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+    s_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+    # dataset this one was reused or derived from
+    source = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='reused_by')
+    # stages taken from upstream datasets instead of generated, {stage: dataset id}
+    reused_stages = models.JSONField(default=dict)
+
+    def get_param_hash(self, fields=PARAM_HASH_FIELDS):
+        def canonical(value):
+            # 1 and 1.0 generate the same data, so numbers inside vectors and args hash alike
+            if isinstance(value, (list, tuple)):
+                return [canonical(v) for v in value]
+            if isinstance(value, dict):
+                return {k: canonical(v) for k, v in value.items()}
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return float(value)
+            return value
+
+        params = {field: canonical(getattr(self, field)) for field in fields}
+        params['generator_version'] = self.GENERATOR_VERSION
+        return hashlib.sha256(json.dumps(params, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+    def set_hashes(self):
+        # bulk_create skips save(), so rows created in bulk must call this first
+        self.param_hash = self.get_param_hash()
+        for hash_field, fields in self.STAGE_HASH_FIELDS.items():
+            setattr(self, hash_field, self.get_param_hash(fields))
+
+    def save(self, *args, **kwargs):
+        self.set_hashes()
+        super().save(*args, **kwargs)
 
     def get_data_file_path(self):
-        return f"./media/dgp/lda/dgp-lda-{self.id}.csv"
+        if self.data_format == self.DataFormat.CSV:
+            return f"./media/dgp/lda/dgp-lda-{self.id}.csv"
+        return f"./media/dgp/lda/dgp-lda-{self.id}"
+
+    def get_cost(self):
+        # estimated generating cost: documents x mean document length x dictionary size
+        return self.sample_size * (self.doc_size_lower_bound + self.doc_size_upper_bound) / 2 * self.diction_size
+
+    def get_size_features(self):
+        # size parameters runtime and peak memory are predicted from (see beak_terminal.predictor)
+        return (self.sample_size, (self.doc_size_lower_bound + self.doc_size_upper_bound) / 2, self.diction_size,
+                self.feature_size, min(self.block_size, self.sample_size))
 
     def status_run(self):
         assert self.task_status == self.TaskStatus.PEN, "cannot update task status to RUNNING from other than PENDING"
@@ -13,7 +13,16 @@ class LDA_Get_Serializer(serializers.ModelSerializer):
                   'true_ate',
                   'real_unobservable_rate',
                   'execution_time',
+                  'peak_memory',
+                  'stage_metrics',
+                  'block_size',
+                  'streaming',
+                  'workers',
+                  'data_format',
                   'data_file_path',
+                  'param_hash',
+                  'source',
+                  'reused_stages',
 
                   'random_seed',
                   'sample_size',
@@ -27,6 +36,7 @@ class LDA_Get_Serializer(serializers.ModelSerializer):
                   'alpha',
                   'wz_threshold',
 
+                  'corpus_gen_method',
                   'z_gen_method',
                   'z_gen_args',
                   's_gen_method',
@@ -48,6 +58,7 @@ class LDA_Post_Raw_Serializer_v1(serializers.ModelSerializer):
     beta1_vec_str = serializers.CharField()
     betaW_vec_str = serializers.CharField()
     missing_rate = serializers.FloatField()
+    w_err_rate = serializers.FloatField()
 
     class Meta:
         model = LDA
@@ -64,6 +75,14 @@ class LDA_Post_Raw_Serializer_v1(serializers.ModelSerializer):
             'beta0_vec_str',
             'beta1_vec_str',
             'betaW_vec_str',
+            'corpus_gen_method',
+            'data_format',
+            'block_size',
+            'streaming',
+            'workers',
+            'wz_threshold',
+            'w_err_method',
+            'w_err_rate',
         )
 
 
@@ -87,6 +106,14 @@ class LDA_Post_Serializer_v1(serializers.ModelSerializer):
                   'beta1',
                   'betaW',
                   'gamma_null',
+                  'corpus_gen_method',
+                  'data_format',
+                  'block_size',
+                  'streaming',
+                  'workers',
+                  'wz_threshold',
+                  'w_err_method',
+                  'w_err_args',
                   's_gen_args',
                   'h_covariance')
 
@@ -130,6 +157,11 @@ class LDA_Post_Raw_Serializer_v2(serializers.ModelSerializer):
             'betaW_vec_str',
 
             'wz_threshold',
+            'corpus_gen_method',
+            'data_format',
+            'block_size',
+            'streaming',
+            'workers',
             'z_gen_method',
             'z_gen_args_str',
             's_gen_method',
@@ -163,6 +195,11 @@ class LDA_Post_Serializer_v2(serializers.ModelSerializer):
                   'betaW',
                   'gamma_null',
                   'wz_threshold',
+                  'corpus_gen_method',
+                  'data_format',
+                  'block_size',
+                  'streaming',
+                  'workers',
                   'z_gen_method',
                   'z_gen_args',
                   's_gen_method',
@@ -172,3 +209,34 @@ class LDA_Post_Serializer_v2(serializers.ModelSerializer):
                   'h_covariance',
                   'w_err_method',
                   'w_err_args')
+
+
+# Derive form: a source dataset plus the downstream parameters to change; omitted ones keep the source's values.
+class LDA_Derive_Raw_Serializer(serializers.ModelSerializer):
+    source_id = serializers.IntegerField()
+    missing_rate = serializers.FloatField(required=False)
+    beta0_vec_str = serializers.CharField(required=False)
+    beta1_vec_str = serializers.CharField(required=False)
+    betaW_vec_str = serializers.CharField(required=False)
+    w_err_rate = serializers.FloatField(required=False)
+
+    class Meta:
+        model = LDA
+        fields = (
+            'source_id',
+            'missing_rate',
+            's_gen_method',
+            'beta0_vec_str',
+            'beta1_vec_str',
+            'betaW_vec_str',
+            'wz_threshold',
+            'w_err_method',
+            'w_err_rate',
+        )
+
+
+# Derived lda object to store: every v2 field, plus the dataset it derives from.
+class LDA_Derive_Serializer(serializers.ModelSerializer):
+    class Meta:
+        model = LDA
+        fields = LDA_Post_Serializer_v2.Meta.fields + ('source',)
@@ -2,7 +2,10 @@ import time
 
 from celery import shared_task
 
+from beak_terminal.progress import report_status
+from beak_terminal.resources import PeakMemory
 from .models import LDA
+from .lda.cache import find_cached, reuse
 from .lda.model import run as lda_run
 
 
@@ -13,17 +16,29 @@ def async_dgp_lda_task(id):
     lda_obj.data_file_path = lda_obj.get_data_file_path()
     lda_obj.status_run()
     lda_obj.save()
+    report_status("dgp", id, lda_obj.task_status)
 
     try:
         start_time = time.time()
-        lda_run(id)
+        with PeakMemory() as memory:
+            source = find_cached(lda_obj)
+            if source is not None:
+                reuse(lda_obj, source)
+                lda_obj.save()
+            else:
+                lda_run(id)
         duration = time.time() - start_time
         lda_obj = LDA.objects.get(id=id)
-        lda_obj.execution_time = duration
+        # a cached dataset is only linked; like a cache hit at submission it records no timings, which
+        # would otherwise enter the runtime and memory history of beak_terminal.predictor
+        lda_obj.execution_time = duration if source is None else 0.0
+        lda_obj.peak_memory = memory.peak if source is None else None
         lda_obj.status_success()
         lda_obj.save()
+        report_status("dgp", id, lda_obj.task_status)
     except Exception as e:
         lda_obj = LDA.objects.get(id=id)
         lda_obj.status_fail()
         lda_obj.err_log_info = f"{type(e)}\n{str(e)}"
         lda_obj.save()
+        report_status("dgp", id, lda_obj.task_status)
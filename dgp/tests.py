@@ -1,3 +1,114 @@
-from django.test import TestCase
+import os
+import tempfile
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from .lda.model import Executor, Methods_H_Generating, Methods_S_Generating, Methods_W_Error, Methods_Z_Generating
+from .lda.corpus import get_corpus_file_path, load_omega
+from .lda.storage import read_columnar, read_omega_rows
+from .models import LDA
+
+
+def make_executor(data_file_path, random_seed=7, **kwargs):
+    rng = np.random.default_rng(random_seed)
+    options = dict(
+        sample_size=250, feature_size=3, diction_size=40, doc_size_lower_bound=5, doc_size_upper_bound=30,
+        alpha=np.ones(3), gamma_null=np.full(40, 0.1), beta0=np.array([1.0, 2.0, 3.0]),
+        beta1=np.array([2.0, 3.0, 5.0]), betaW=np.array([1.0, -1.0, 0.5]), wz_threshold=0.0,
+        h_covariance=[[1.0, 0.0], [0.0, 1.0]], data_file_path=data_file_path, random_seed=random_seed, rng=rng,
+        H_generating_func=Methods_H_Generating().Get(method_str="linear", gen_args={}),
+        S_generating_func=Methods_S_Generating(rng).Get(method_str="exact", gen_args={"missing_rate": 0.2}),
+        Z_generating_func=Methods_Z_Generating(rng).Get(method_str="normal", gen_args={}),
+        W_error_flip_func=Methods_W_Error(rng).Get(method_str="random", gen_args={"error_rate": 0.1}),
+    )
+    return Executor(**{**options, **kwargs})
+
+
+def read_bytes(path):
+    # raw bytes of every column file of a columnar dataset
+    return {name: open(os.path.join(path, name), "rb").read() for name in sorted(os.listdir(path))
+            if name.endswith(".bin")}
+
+
+class BlockGenerationTest(SimpleTestCase):
+    # a dataset is determined by its seed and block size, whatever the output mode or worker count
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def generate(self, name, **kwargs):
+        path = os.path.join(self.directory.name, name)
+        executor = make_executor(path, block_size=60, **kwargs)
+        executor()
+        executor.wait()
+        return path
+
+    def test_streaming_and_workers_give_identical_columns(self):
+        for corpus_gen_method in LDA.CorpusGenMethod.values:
+            expected = read_bytes(self.generate(f"{corpus_gen_method}-base", corpus_gen_method=corpus_gen_method))
+            self.assertIn("omega_counts.bin", expected)
+            for streaming in (False, True):
+                for workers in (1, 3):
+                    path = self.generate(f"{corpus_gen_method}-{streaming}-{workers}", streaming=streaming,
+                                         workers=workers, corpus_gen_method=corpus_gen_method)
+                    with self.subTest(corpus_gen_method=corpus_gen_method, streaming=streaming, workers=workers):
+                        self.assertEqual(read_bytes(path), expected)
+
+    def test_columns_are_consistent(self):
+        columns, meta = read_columnar(self.generate("base"))
+        self.assertEqual(meta["sample_size"], 250)
+        self.assertEqual(columns["X"].shape, (250, 3))
+        self.assertEqual(len(columns["omega_offsets"]), 251)
+        self.assertTrue(np.all(columns["W"][columns["S"] == 0] == -1))
+
+
+class DatasetSavingTest(SimpleTestCase):
+    # the same dataset comes out whatever the format it is saved in and the thread it is saved on
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def generate(self, name, **kwargs):
+        path = os.path.join(self.directory.name, name)
+        executor = make_executor(path, block_size=60, **kwargs)
+        executor()
+        executor.wait()
+        return path
+
+    def test_background_save_is_identical(self):
+        expected = read_bytes(self.generate("foreground"))
+        for workers in (1, 3):
+            with self.subTest(workers=workers):
+                self.assertEqual(read_bytes(self.generate(f"background-{workers}", workers=workers,
+                                                          background_save=True)), expected)
+
+    def test_background_save_keeps_arrays(self):
+        path = os.path.join(self.directory.name, "background")
+        executor = make_executor(path, block_size=60, background_save=True)
+        executor()
+        arrays = executor.arrays()
+        executor.wait()
+        columns, _ = read_columnar(path)
+        for name in ("X", "W", "Y"):
+            np.testing.assert_array_equal(arrays[name], columns[name])
+        self.assertEqual((arrays["omega"] != read_omega_rows(columns, 0, 250, 40)).nnz, 0)
+
+    def test_csv_matches_columnar(self):
+        columns, _ = read_columnar(self.generate("columnar"))
+        for streaming in (False, True):
+            with self.subTest(streaming=streaming):
+                path = self.generate(f"csv-{streaming}.csv", data_format=LDA.DataFormat.CSV, streaming=streaming)
+                df = pd.read_csv(path, index_col=0, float_precision="round_trip")
+                np.testing.assert_array_equal(df[[f"X{i}" for i in range(3)]].to_numpy(), columns["X"])
+                for name in ("Y", "W", "W_true"):
+                    np.testing.assert_array_equal(df[name].to_numpy(), columns[name])
+                omega = load_omega(get_corpus_file_path(path))
+                np.testing.assert_array_equal(omega.indptr, columns["omega_offsets"])
+                np.testing.assert_array_equal(omega.indices, columns["omega_indices"])
+                np.testing.assert_array_equal(omega.data, columns["omega_counts"])
@@ -5,6 +5,7 @@ from .views import *
 router = routers.DefaultRouter()
 router.register(r'lda/log', LatentDirichletAllocationDataGeneratingProcessLogView, 'dgp_lda_log')
 router.register(r'lda/add', LatentDirichletAllocationDataGeneratingProcessTaskCreate, 'dgp_lda_add')
+router.register(r'lda/derive', LatentDirichletAllocationDataGeneratingProcessTaskDerive, 'dgp_lda_derive')
 
 urlpatterns = [
     path('', include(router.urls)),
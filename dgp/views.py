@@ -1,14 +1,35 @@
 import json
 from django.core.paginator import Paginator
 
+from beak_terminal.predictor import admit_dgp
+from beak_terminal.progress import report_status
+from beak_terminal.routing import get_dgp_queue
+
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 
-from .serializers import LDA_Get_Serializer, LDA_Post_Serializer_v1, LDA_Post_Raw_Serializer_v1
+from .serializers import LDA_Get_Serializer, LDA_Post_Serializer_v1, LDA_Post_Raw_Serializer_v1, \
+    LDA_Derive_Raw_Serializer, LDA_Derive_Serializer
 from .models import LDA
+from .lda.cache import find_cached, reuse
 from .tasks import async_dgp_lda_task
 
 
+def submit_lda_task(instance):
+    # Identical configuration already generated: reuse its dataset instead of running a task
+    source = find_cached(instance)
+    if source is not None:
+        instance.status_run()
+        reuse(instance, source)
+        instance.execution_time = 0.0
+        instance.status_success()
+        instance.save()
+        report_status("dgp", instance.id, instance.task_status)
+        return
+    # Async task
+    async_dgp_lda_task.apply_async((instance.id,), queue=get_dgp_queue(instance))
+
+
 # Create your views here.
 class LatentDirichletAllocationDataGeneratingProcessLogView(viewsets.ModelViewSet):
     serializer_class = LDA_Get_Serializer
@@ -44,6 +65,18 @@ class LatentDirichletAllocationDataGeneratingProcessTaskCreate(viewsets.ModelVie
 
     http_method_names = ['post']
 
+    # values of the optional v1 fields when they are not posted
+    v1_defaults = {
+        "corpus_gen_method": LDA.CorpusGenMethod.TOK,
+        "data_format": LDA.DataFormat.COL,
+        "block_size": 10000,
+        "streaming": 'false',
+        "workers": 1,
+        "wz_threshold": 0,
+        "w_err_method": LDA.MislabelError.NON,
+        "w_err_rate": 0.0,
+    }
+
     def create(self, request, *args, **kwarg):
         user = request.user
         data_v1 = {
@@ -58,6 +91,14 @@ class LatentDirichletAllocationDataGeneratingProcessTaskCreate(viewsets.ModelVie
             "beta0_vec_str": request.POST.get('beta0_vec_str', None),
             "beta1_vec_str": request.POST.get('beta1_vec_str', None),
             "betaW_vec_str": request.POST.get('betaW_vec_str', None),
+            "corpus_gen_method": request.POST.get('corpus_gen_method', self.v1_defaults["corpus_gen_method"]),
+            "data_format": request.POST.get('data_format', self.v1_defaults["data_format"]),
+            "block_size": request.POST.get('block_size', self.v1_defaults["block_size"]),
+            "streaming": request.POST.get('streaming', self.v1_defaults["streaming"]),
+            "workers": request.POST.get('workers', self.v1_defaults["workers"]),
+            "wz_threshold": request.POST.get('wz_threshold', self.v1_defaults["wz_threshold"]),
+            "w_err_method": request.POST.get('w_err_method', self.v1_defaults["w_err_method"]),
+            "w_err_rate": request.POST.get('w_err_rate', self.v1_defaults["w_err_rate"]),
             "operator": user,
         }
 
@@ -69,11 +110,17 @@ class LatentDirichletAllocationDataGeneratingProcessTaskCreate(viewsets.ModelVie
 
         serializer = self.save_serializer_class(data=data, context={'author': user})
         if serializer.is_valid():
-            serializer.save()
+            # predicted runtime and memory; a job over the worker memory budget is switched or rejected
+            prediction, changes, err_msg = admit_dgp(LDA(**serializer.validated_data))
+            if err_msg:
+                return Response(data={"error": err_msg, "prediction": prediction}, status=status.HTTP_400_BAD_REQUEST)
+            serializer.save(**changes)
             instance = LDA.objects.filter(id=serializer.data['id']).first()
-            # Async task
-            async_dgp_lda_task.delay(serializer.data['id'])
-            return Response(data=self.display_serializer_class(instance).data, status=status.HTTP_201_CREATED)
+            submit_lda_task(instance)
+            instance.refresh_from_db()
+            return Response(data={**self.display_serializer_class(instance).data,
+                                  "prediction": {**prediction, "switched": changes}},
+                            status=status.HTTP_201_CREATED)
         else:
             return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -156,6 +203,34 @@ class LatentDirichletAllocationDataGeneratingProcessTaskCreate(viewsets.ModelVie
         if err_msg:
             return err_msg
 
+        if data["corpus_gen_method"] not in LDA.CorpusGenMethod.values:
+            return f"invalid corpus gen method; valid values are {', '.join(LDA.CorpusGenMethod.values)}"
+
+        if data["data_format"] not in LDA.DataFormat.values:
+            return f"invalid data format; valid values are {', '.join(LDA.DataFormat.values)}"
+
+        err_msg = validator(field_name="block_size", check_T=int, valid_range=(100, 1000000))
+        if err_msg:
+            return err_msg
+
+        if str(data["streaming"]).lower() not in ("true", "false"):
+            return "invalid streaming input format; valid values are true, false"
+
+        err_msg = validator(field_name="workers", check_T=int, valid_range=(1, 64))
+        if err_msg:
+            return err_msg
+
+        err_msg = validator(field_name="wz_threshold", check_T=int, valid_range=(-500, 500))
+        if err_msg:
+            return err_msg
+
+        if data["w_err_method"] not in LDA.MislabelError.values:
+            return f"invalid w err method; valid values are {', '.join(LDA.MislabelError.values)}"
+
+        err_msg = validator(field_name="w_err_rate", check_T=float, valid_range=(0.0, 1.0))
+        if err_msg:
+            return err_msg
+
     # V1 Data Purifier
     def v1_purify_data(self, data):
         purified_schema = {
@@ -171,8 +246,100 @@ class LatentDirichletAllocationDataGeneratingProcessTaskCreate(viewsets.ModelVie
             "beta0": json.loads(data["beta0_vec_str"]),
             "beta1": json.loads(data["beta1_vec_str"]),
             "betaW": json.loads(data["betaW_vec_str"]),
+            "corpus_gen_method": data["corpus_gen_method"],
+            "data_format": data["data_format"],
+            "block_size": int(data["block_size"]),
+            "streaming": str(data["streaming"]).lower() == "true",
+            "workers": int(data["workers"]),
+            "wz_threshold": int(data["wz_threshold"]),
+            "w_err_method": data["w_err_method"],
+            "w_err_args": {"error_rate": float(data["w_err_rate"])}
+            if data["w_err_method"] == LDA.MislabelError.RAN else {},
             "gamma_null": [1] * int(data["diction_size"]),
             "h_covariance": [[0.4, 0], [0, 0.6]],
             "s_gen_args": {"missing_rate": float(data["missing_rate"])},
         }
         return purified_schema
+
+
+# Derives a dataset from an existing one, changing only downstream parameters (missing rate, mislabel error,
+# treatment threshold, outcome and treatment coefficients). Stages left unchanged are reused from the source.
+class LatentDirichletAllocationDataGeneratingProcessTaskDerive(LatentDirichletAllocationDataGeneratingProcessTaskCreate):
+    serializer_class = LDA_Derive_Raw_Serializer
+    save_serializer_class = LDA_Derive_Serializer
+
+    # parameters a derived dataset may override
+    DOWNSTREAM_FIELDS = ('beta0', 'beta1', 'betaW', 'wz_threshold', 'w_err_method', 'w_err_args', 's_gen_args')
+
+    def create(self, request, *args, **kwarg):
+        user = request.user
+        source_id = request.POST.get('source_id', '')
+        if not source_id.isnumeric():
+            return Response(data={"error": "invalid source id input format"}, status=status.HTTP_400_BAD_REQUEST)
+        source = LDA.objects.filter(id=int(source_id)).first()
+        if source is None:
+            return Response(data={"error": f"dataset {source_id} does not exist"}, status=status.HTTP_404_NOT_FOUND)
+        if source.task_status != LDA.TaskStatus.SUC:
+            return Response(data={"error": f"dataset {source_id} has not been generated successfully"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # the v1 form prefilled from the source, with the downstream overrides applied
+        data_v1 = {
+            "random_seed": source.random_seed,
+            "sample_size": source.sample_size,
+            "feature_size": source.feature_size,
+            "diction_size": source.diction_size,
+            "doc_size_lower_bound": source.doc_size_lower_bound,
+            "doc_size_upper_bound": source.doc_size_upper_bound,
+            "missing_rate": request.POST.get('missing_rate', source.s_gen_args.get("missing_rate", 0.0)),
+            "alpha_vec_str": json.dumps(source.alpha),
+            "beta0_vec_str": request.POST.get('beta0_vec_str', json.dumps(source.beta0)),
+            "beta1_vec_str": request.POST.get('beta1_vec_str', json.dumps(source.beta1)),
+            "betaW_vec_str": request.POST.get('betaW_vec_str', json.dumps(source.betaW)),
+            "corpus_gen_method": source.corpus_gen_method,
+            "data_format": source.data_format,
+            "block_size": source.block_size,
+            "streaming": str(source.streaming).lower(),
+            "workers": source.workers,
+            "wz_threshold": request.POST.get('wz_threshold', source.wz_threshold),
+            "w_err_method": request.POST.get('w_err_method', source.w_err_method),
+            "w_err_rate": request.POST.get('w_err_rate', source.w_err_args.get("error_rate", 0.0)),
+            "s_gen_method": request.POST.get('s_gen_method', source.s_gen_method),
+            "operator": user,
+        }
+
+        err_msg = self.v1_validate_data(data_v1)
+        if err_msg:
+            return Response(data={"error": err_msg}, status=status.HTTP_400_BAD_REQUEST)
+        if data_v1["s_gen_method"] not in LDA.UnobservableCasesGenMethod.values:
+            return Response(data={"error": f"invalid s gen method; valid values are "
+                                           f"{', '.join(LDA.UnobservableCasesGenMethod.values)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        purified = self.v1_purify_data(data_v1)
+        data = dict(self.save_serializer_class(source).data)
+        data.pop('id')
+        data.update({field: purified[field] for field in self.DOWNSTREAM_FIELDS})
+        data.update({
+            "operator_id": purified["operator_id"],
+            "operator_name": purified["operator_name"],
+            "s_gen_method": data_v1["s_gen_method"],
+            "s_gen_args": {**source.s_gen_args, **purified["s_gen_args"]},
+            "source": source.id,
+        })
+
+        serializer = self.save_serializer_class(data=data, context={'author': user})
+        if serializer.is_valid():
+            # predicted runtime and memory; a job over the worker memory budget is switched or rejected
+            prediction, changes, err_msg = admit_dgp(LDA(**serializer.validated_data))
+            if err_msg:
+                return Response(data={"error": err_msg, "prediction": prediction}, status=status.HTTP_400_BAD_REQUEST)
+            serializer.save(**changes)
+            instance = LDA.objects.filter(id=serializer.data['id']).first()
+            submit_lda_task(instance)
+            instance.refresh_from_db()
+            return Response(data={**self.display_serializer_class(instance).data,
+                                  "prediction": {**prediction, "switched": changes}},
+                            status=status.HTTP_201_CREATED)
+        else:
+            return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
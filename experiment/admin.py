@@ -0,0 +1,18 @@
+from django.contrib import admin
+
+# Register your models here.
+from .models import Replication, Sweep
+
+
+class SweepAdmin(admin.ModelAdmin):
+    list_display = ("id", "timestamp", "task_status")
+
+
+admin.site.register(Sweep, SweepAdmin)
+
+
+class ReplicationAdmin(admin.ModelAdmin):
+    list_display = ("id", "timestamp", "task_status")
+
+
+admin.site.register(Replication, ReplicationAdmin)
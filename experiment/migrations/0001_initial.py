@@ -0,0 +1,51 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:48
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("stan", "0007_lda_ate_posterior"),
+        ("dgp", "0007_lda_stage_hashes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Sweep",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("operator_name", models.CharField(max_length=64)),
+                ("timestamp", models.DateTimeField(auto_now_add=True)),
+                ("base_config", models.JSONField()),
+                ("axes", models.JSONField()),
+                ("sampler", models.CharField(choices=[("vi", "Variational Inference"), ("nut", "Non U-Turn Metropolis Hasting"), ("svi", "Stochastic Variational Inference (in process)"), ("pathfinder", "Pathfinder"), ("laplace", "Laplace Approximation")], default="vi", max_length=16)),
+                ("likelihood", models.CharField(choices=[("token", "PER TOKEN"), ("count", "PER (DOC, WORD) COUNT")], default="token", max_length=16)),
+                ("lanes", models.IntegerField(default=4, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(64)])),
+                ("task_status", models.CharField(choices=[("pending", "PENDING"), ("running", "RUNNING"), ("failure", "FAILURE"), ("success", "SUCCESS")], default="pending", max_length=8)),
+                ("execution_time", models.FloatField(blank=True, null=True)),
+                ("err_log_info", models.CharField(blank=True, max_length=1000000, null=True)),
+                ("operator_id", models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="sweep_operator_id", to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="SweepItem",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("index", models.IntegerField()),
+                ("params", models.JSONField()),
+                ("data", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="sweep_items", to="dgp.lda")),
+                ("estimation", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="sweep_items", to="stan.lda")),
+                ("sweep", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="items", to="experiment.sweep")),
+            ],
+            options={
+                "ordering": ("sweep", "index"),
+            },
+        ),
+    ]
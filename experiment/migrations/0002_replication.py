@@ -0,0 +1,40 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:50
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("experiment", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Replication",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("operator_name", models.CharField(max_length=64)),
+                ("timestamp", models.DateTimeField(auto_now_add=True)),
+                ("base_config", models.JSONField()),
+                ("replications", models.IntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(1000)])),
+                ("sampler", models.CharField(choices=[("vi", "Variational Inference"), ("nut", "Non U-Turn Metropolis Hasting"), ("svi", "Stochastic Variational Inference (in process)"), ("pathfinder", "Pathfinder"), ("laplace", "Laplace Approximation")], default="vi", max_length=16)),
+                ("likelihood", models.CharField(choices=[("token", "PER TOKEN"), ("count", "PER (DOC, WORD) COUNT")], default="token", max_length=16)),
+                ("completed", models.IntegerField(default=0)),
+                ("failed", models.IntegerField(default=0)),
+                ("error_sum", models.FloatField(default=0)),
+                ("error_sq_sum", models.FloatField(default=0)),
+                ("interval_count", models.IntegerField(default=0)),
+                ("covered_count", models.IntegerField(default=0)),
+                ("task_status", models.CharField(choices=[("pending", "PENDING"), ("running", "RUNNING"), ("failure", "FAILURE"), ("success", "SUCCESS")], default="pending", max_length=8)),
+                ("execution_time", models.FloatField(blank=True, null=True)),
+                ("err_log_info", models.CharField(blank=True, max_length=1000000, null=True)),
+                ("data_file_path", models.CharField(blank=True, max_length=4096, null=True)),
+                ("operator_id", models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="replication_operator_id", to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
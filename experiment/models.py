@@ -0,0 +1,133 @@
+from django.db import models
+from django.contrib.auth.models import User
+from django.core.validators import MaxValueValidator, MinValueValidator
+
+from dgp.models import LDA as DGP_LDA
+from stan.models import LDA as STAN_LDA
+
+
+# Create your models here.
+class Sweep(models.Model):
+    class TaskStatus(models.TextChoices):
+        PEN = "pending", "PENDING"
+        RUN = "running", "RUNNING"
+        ERR = "failure", "FAILURE"
+        SUC = "success", "SUCCESS"
+
+    # operator
+    operator_id = models.ForeignKey(User, null=True, on_delete=models.SET_NULL, related_name='sweep_operator_id')
+    # operator string (will not be affected even if the user has been deleted)
+    operator_name = models.CharField(max_length=64)
+    # when is the task created
+    timestamp = models.DateTimeField(auto_now=False, auto_now_add=True)
+
+    # dgp v1 form every item starts from
+    base_config = models.JSONField()
+    # swept parameters, {dgp v1 form field: [values]}; items are their cartesian product
+    axes = models.JSONField()
+    # estimation settings shared by every item
+    sampler = models.CharField(max_length=16, choices=STAN_LDA.SampleMethod.choices, default=STAN_LDA.SampleMethod.VI)
+    likelihood = models.CharField(max_length=16, choices=STAN_LDA.Likelihood.choices, default=STAN_LDA.Likelihood.TOK)
+    # items run at the same time; each lane runs its items one after another
+    lanes = models.IntegerField(default=4, validators=[MinValueValidator(1), MaxValueValidator(64)])
+
+    # task status
+    task_status = models.CharField(max_length=8, choices=TaskStatus.choices, default=TaskStatus.PEN)
+    # execution time in seconds
+    execution_time = models.FloatField(blank=True, null=True)
+    # err log information
+    err_log_info = models.CharField(max_length=1000000, blank=True, null=True)
+
+    def status_run(self):
+        assert self.task_status == self.TaskStatus.PEN, "cannot update task status to RUNNING from other than PENDING"
+        self.task_status = self.TaskStatus.RUN
+
+    def status_fail(self):
+        assert self.task_status == self.TaskStatus.RUN, "cannot update task status to FAILURE from other than RUNNING"
+        self.task_status = self.TaskStatus.ERR
+
+    def status_success(self):
+        assert self.task_status == self.TaskStatus.RUN, "cannot update task status to SUCCESS from other than RUNNING"
+        self.task_status = self.TaskStatus.SUC
+
+    def __str__(self):
+        return f"SWEEP-{self.id}"
+
+
+class SweepItem(models.Model):
+    # sweep the item belongs to
+    sweep = models.ForeignKey(Sweep, on_delete=models.CASCADE, related_name='items')
+    # position in the expanded grid
+    index = models.IntegerField()
+    # axis values of the item, {dgp v1 form field: value}
+    params = models.JSONField()
+    # generated dataset
+    data = models.ForeignKey(DGP_LDA, on_delete=models.CASCADE, related_name='sweep_items')
+    # estimation on the dataset
+    estimation = models.ForeignKey(STAN_LDA, on_delete=models.CASCADE, related_name='sweep_items')
+
+    class Meta:
+        ordering = ('sweep', 'index')
+
+    def __str__(self):
+        return f"SWEEP-{self.sweep_id}-{self.index}"
+
+
+class Replication(models.Model):
+    class TaskStatus(models.TextChoices):
+        PEN = "pending", "PENDING"
+        RUN = "running", "RUNNING"
+        ERR = "failure", "FAILURE"
+        SUC = "success", "SUCCESS"
+
+    # operator
+    operator_id = models.ForeignKey(User, null=True, on_delete=models.SET_NULL, related_name='replication_operator_id')
+    # operator string (will not be affected even if the user has been deleted)
+    operator_name = models.CharField(max_length=64)
+    # when is the task created
+    timestamp = models.DateTimeField(auto_now=False, auto_now_add=True)
+
+    # dgp v1 form every replication runs; replication r uses random seed random_seed + r
+    base_config = models.JSONField()
+    # number of replications
+    replications = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(1000)])
+    # estimation settings shared by every replication
+    sampler = models.CharField(max_length=16, choices=STAN_LDA.SampleMethod.choices, default=STAN_LDA.SampleMethod.VI)
+    likelihood = models.CharField(max_length=16, choices=STAN_LDA.Likelihood.choices, default=STAN_LDA.Likelihood.TOK)
+
+    # running aggregates, updated as each replication finishes
+    completed = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    # sums of the ATE error (estimated - true) and of its square over completed replications
+    error_sum = models.FloatField(default=0)
+    error_sq_sum = models.FloatField(default=0)
+    # completed replications with a 95% interval, and those whose interval covers the true ATE
+    interval_count = models.IntegerField(default=0)
+    covered_count = models.IntegerField(default=0)
+
+    # task status
+    task_status = models.CharField(max_length=8, choices=TaskStatus.choices, default=TaskStatus.PEN)
+    # execution time in seconds
+    execution_time = models.FloatField(blank=True, null=True)
+    # err log information
+    err_log_info = models.CharField(max_length=1000000, blank=True, null=True)
+    # per-replication results, fixed-size binary records (see experiment.replication.RECORD_DTYPE)
+    data_file_path = models.CharField(max_length=4096, blank=True, null=True)
+
+    def get_data_file_path(self):
+        return f"./media/experiment/replication-{self.id}.bin"
+
+    def status_run(self):
+        assert self.task_status == self.TaskStatus.PEN, "cannot update task status to RUNNING from other than PENDING"
+        self.task_status = self.TaskStatus.RUN
+
+    def status_fail(self):
+        assert self.task_status == self.TaskStatus.RUN, "cannot update task status to FAILURE from other than RUNNING"
+        self.task_status = self.TaskStatus.ERR
+
+    def status_success(self):
+        assert self.task_status == self.TaskStatus.RUN, "cannot update task status to SUCCESS from other than RUNNING"
+        self.task_status = self.TaskStatus.SUC
+
+    def __str__(self):
+        return f"REPLICATION-{self.id}"
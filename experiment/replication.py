@@ -0,0 +1,85 @@
+import math
+import os
+
+import numpy as np
+from django.db.models import F
+
+from .models import Replication
+
+MAX_REPLICATIONS = 1000
+
+# One fixed-size record per finished replication, appended in completion order. A record is written
+# with a single O_APPEND write, so replications finishing at the same time on different workers
+# never interleave; a failed replication has NaN estimates.
+RECORD_DTYPE = np.dtype([
+    ("index", "<i4"),
+    ("random_seed", "<i4"),
+    ("data", "<i8"),
+    ("estimation", "<i8"),
+    ("true_ate", "<f8"),
+    ("estimated_ate", "<f8"),
+    ("ate_q025", "<f8"),
+    ("ate_q975", "<f8"),
+    ("execution_time", "<f8"),
+])
+
+
+def get_configs(base_config, replications):
+    # dgp v1 form of every replication, identical but for consecutive random seeds
+    seed = int(base_config.get("random_seed", 1))
+    return [{**base_config, "random_seed": seed + index} for index in range(replications)]
+
+
+def append_result(replication, index, data, estimation):
+    def value(number):
+        return np.nan if number is None else number
+
+    succeeded = estimation.task_status == estimation.TaskStatus.SUC
+    record = np.array([(
+        index, data.random_seed, data.id, estimation.id, value(data.true_ate),
+        value(estimation.estimated_ate) if succeeded else np.nan,
+        value(estimation.ate_q025) if succeeded else np.nan,
+        value(estimation.ate_q975) if succeeded else np.nan,
+        value(data.execution_time) + value(estimation.execution_time),
+    )], dtype=RECORD_DTYPE)
+    os.makedirs(os.path.dirname(replication.data_file_path), exist_ok=True)
+    fd = os.open(replication.data_file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, record.tobytes())
+    finally:
+        os.close(fd)
+
+    # one UPDATE folding the replication into the running aggregates, safe under concurrent workers
+    if not succeeded or math.isnan(record["estimated_ate"][0]) or math.isnan(record["true_ate"][0]):
+        Replication.objects.filter(id=replication.id).update(failed=F("failed") + 1)
+        return
+    error = float(record["estimated_ate"][0] - record["true_ate"][0])
+    updates = {"completed": F("completed") + 1, "error_sum": F("error_sum") + error,
+               "error_sq_sum": F("error_sq_sum") + error ** 2}
+    if not np.isnan(record["ate_q025"][0]) and not np.isnan(record["ate_q975"][0]):
+        covered = bool(record["ate_q025"][0] <= record["true_ate"][0] <= record["ate_q975"][0])
+        updates.update({"interval_count": F("interval_count") + 1,
+                        "covered_count": F("covered_count") + int(covered)})
+    Replication.objects.filter(id=replication.id).update(**updates)
+
+
+def read_results(replication):
+    # the records of finished replications, in completion order
+    if not replication.data_file_path or not os.path.exists(replication.data_file_path):
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.fromfile(replication.data_file_path, dtype=RECORD_DTYPE)
+
+
+def get_statistics(replication):
+    # bias, RMSE and 95% interval coverage from the running aggregates
+    count = replication.completed
+    return {
+        "count": count,
+        "bias": replication.error_sum / count if count else None,
+        "rmse": math.sqrt(replication.error_sq_sum / count) if count else None,
+        "coverage": replication.covered_count / replication.interval_count if replication.interval_count else None,
+    }
+
+
+def get_progress(replication):
+    return {"completed": replication.completed, "failed": replication.failed, "total": replication.replications}
@@ -0,0 +1,120 @@
+from rest_framework import serializers
+from .models import Replication, Sweep
+from . import replication
+from .sweep import get_progress, get_results
+
+
+class Sweep_Get_Serializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+    results = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Sweep
+        fields = ('id',
+                  'task_status',
+                  'err_log_info',
+                  'operator_name',
+                  'timestamp',
+                  'execution_time',
+                  'base_config',
+                  'axes',
+                  'sampler',
+                  'likelihood',
+                  'lanes',
+                  'progress',
+                  'results')
+
+    def get_progress(self, obj):
+        return get_progress(obj)
+
+    def get_results(self, obj):
+        return get_results(obj)
+
+
+class Sweep_Post_Raw_Serializer(serializers.ModelSerializer):
+    base_config_str = serializers.CharField()
+    axes_str = serializers.CharField()
+
+    class Meta:
+        model = Sweep
+        fields = (
+            'base_config_str',
+            'axes_str',
+            'sampler',
+            'likelihood',
+            'lanes',
+        )
+
+
+class Sweep_Post_Serializer(serializers.ModelSerializer):
+    class Meta:
+        model = Sweep
+        fields = (
+            'id',
+            'operator_id',
+            'operator_name',
+            'base_config',
+            'axes',
+            'sampler',
+            'likelihood',
+            'lanes',
+        )
+
+
+class Replication_Get_Serializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+    statistics = serializers.SerializerMethodField()
+    results = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Replication
+        fields = ('id',
+                  'task_status',
+                  'err_log_info',
+                  'operator_name',
+                  'timestamp',
+                  'execution_time',
+                  'base_config',
+                  'replications',
+                  'sampler',
+                  'likelihood',
+                  'progress',
+                  'statistics',
+                  'results')
+
+    def get_progress(self, obj):
+        return replication.get_progress(obj)
+
+    def get_statistics(self, obj):
+        return replication.get_statistics(obj)
+
+    def get_results(self, obj):
+        return [{name: None if value != value else value for name, value in zip(record.dtype.names, record.tolist())}
+                for record in replication.read_results(obj)]
+
+
+class Replication_Post_Raw_Serializer(serializers.ModelSerializer):
+    base_config_str = serializers.CharField()
+
+    class Meta:
+        model = Replication
+        fields = (
+            'base_config_str',
+            'replications',
+            'sampler',
+            'likelihood',
+        )
+
+
+class Replication_Post_Serializer(serializers.ModelSerializer):
+    class Meta:
+        model = Replication
+        fields = (
+            'id',
+            'operator_id',
+            'operator_name',
+            'base_config',
+            'replications',
+            'sampler',
+            'likelihood',
+        )
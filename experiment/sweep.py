@@ -0,0 +1,88 @@
+import itertools
+import json
+
+import numpy as np
+
+from stan.models import LDA as STAN_LDA
+
+MAX_ITEMS = 1000
+
+
+def expand(base_config, axes):
+    # (axis values, dgp v1 form) of every point of the grid, in row-major order of the axes
+    names = list(axes)
+    for values in itertools.product(*(axes[name] for name in names)):
+        params = dict(zip(names, values))
+        config = {**base_config, **params}
+        # vectors may be given as JSON lists; the v1 form takes them as strings
+        for field, value in config.items():
+            if field.endswith("_vec_str") and not isinstance(value, str):
+                config[field] = json.dumps(value)
+        yield params, config
+
+
+def assign_lanes(items, lanes):
+    # Split items into at most lanes sequential lanes. Items sharing a corpus go to the same lane, so
+    # the first one generates it and the rest reuse it (see dgp.lda.cache.find_upstream); groups are
+    # placed largest first on the least loaded lane.
+    groups = {}
+    for item in items:
+        groups.setdefault(item.data.corpus_hash, []).append(item)
+    assigned = [[] for _ in range(min(lanes, len(items)))]
+    for group in sorted(groups.values(), key=len, reverse=True):
+        min(assigned, key=len).extend(group)
+    return [lane for lane in assigned if lane]
+
+
+def ate_statistics(rows):
+    # bias, RMSE and 95% interval coverage of estimated ATEs, rows of (true, estimated, q025, q975)
+    rows = np.array([[np.nan if value is None else value for value in row] for row in rows if None not in row[:2]],
+                    dtype=float).reshape(-1, 4)
+    if len(rows) == 0:
+        return {"count": 0, "bias": None, "rmse": None, "coverage": None}
+    error = rows[:, 1] - rows[:, 0]
+    covered = rows[~np.isnan(rows[:, 2:]).any(axis=1)]
+    return {
+        "count": len(rows),
+        "bias": float(np.mean(error)),
+        "rmse": float(np.sqrt(np.mean(error ** 2))),
+        "coverage": float(np.mean((covered[:, 2] <= covered[:, 0]) & (covered[:, 0] <= covered[:, 3])))
+        if len(covered) else None,
+    }
+
+
+def get_progress(sweep):
+    # item count by estimation status; an item is done when its estimation is
+    progress = {status: 0 for status in STAN_LDA.TaskStatus.values}
+    for status in sweep.items.values_list('estimation__task_status', flat=True):
+        progress[status] += 1
+    progress["total"] = sum(progress.values())
+    return progress
+
+
+def get_results(sweep):
+    # per-item results, and ATE recovery statistics for every value of every axis
+    results = []
+    for item in sweep.items.select_related('data', 'estimation'):
+        results.append({
+            "index": item.index,
+            "params": item.params,
+            "data": item.data_id,
+            "estimation": item.estimation_id,
+            "task_status": item.estimation.task_status,
+            "true_ate": item.data.true_ate,
+            "estimated_ate": item.estimation.estimated_ate,
+            "ate_q025": item.estimation.ate_q025,
+            "ate_q975": item.estimation.ate_q975,
+        })
+    aggregates = {}
+    for name, values in sweep.axes.items():
+        aggregates[name] = [
+            {"value": value, **ate_statistics(
+                (result["true_ate"], result["estimated_ate"], result["ate_q025"], result["ate_q975"])
+                for result in results
+                if result["params"][name] == value and result["task_status"] == STAN_LDA.TaskStatus.SUC)}
+            for value in values
+        ]
+    return {"items": results, "aggregates": aggregates}
+
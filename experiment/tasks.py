@@ -0,0 +1,187 @@
+import logging
+import time
+
+from celery import chain, chord, shared_task
+from django.db.models import F
+
+from beak_terminal.progress import report_status
+from beak_terminal.resources import PeakMemory
+from beak_terminal.routing import get_stan_queue
+from dgp.models import LDA as DGP_LDA
+from dgp.lda.cache import find_cached
+from dgp.lda.model import run as dgp_lda_run
+from dgp.tasks import async_dgp_lda_task
+from stan.models import LDA as STAN_LDA
+from stan.tasks import run_stan_lda_task
+from .models import Replication, Sweep, SweepItem
+from .replication import append_result
+from .sweep import assign_lanes
+
+logger = logging.getLogger(__name__)
+
+
+def run_pipeline(data_id, estimation_id):
+    # Generate the dataset, then estimate on it, inside the calling task so it holds one worker at a time.
+    # The generated arrays are handed to the estimation in memory while a background thread writes the
+    # dataset out; the dataset is marked successful once its write is done. A cached dataset is linked
+    # rather than generated and a streamed one is released block by block, so both are estimated from
+    # their stored files.
+    dataset = DGP_LDA.objects.get(id=data_id)
+    if dataset.streaming or find_cached(dataset) is not None:
+        async_dgp_lda_task(data_id)
+        if DGP_LDA.objects.get(id=data_id).task_status == DGP_LDA.TaskStatus.SUC:
+            run_stan_lda_task(estimation_id)
+        else:
+            fail_estimation(estimation_id, data_id)
+        return
+
+    dataset.data_file_path = dataset.get_data_file_path()
+    dataset.status_run()
+    dataset.save()
+    report_status("dgp", data_id, dataset.task_status)
+    start_time = time.time()
+    try:
+        with PeakMemory() as memory:
+            executor = dgp_lda_run(data_id, background_save=True)
+        generating_time = time.time() - start_time
+    except Exception as e:
+        fail_dataset(data_id, e)
+        fail_estimation(estimation_id, data_id)
+        return
+
+    run_stan_lda_task(estimation_id, executor.arrays())
+
+    try:
+        executor.wait()
+    except Exception as e:
+        fail_dataset(data_id, e)
+        return
+    dataset = DGP_LDA.objects.get(id=data_id)
+    # generation and write; the estimation overlapping the write is not counted
+    dataset.execution_time = generating_time + executor.save_time
+    dataset.peak_memory = memory.peak
+    dataset.stage_metrics = executor.metrics.as_list()  # with the background write
+    dataset.status_success()
+    dataset.save()
+    report_status("dgp", data_id, dataset.task_status)
+
+
+def fail_dataset(data_id, e):
+    dataset = DGP_LDA.objects.get(id=data_id)
+    dataset.status_fail()
+    dataset.err_log_info = f"{type(e)}\n{str(e)}"
+    dataset.save()
+    report_status("dgp", data_id, dataset.task_status)
+
+
+def fail_estimation(estimation_id, data_id):
+    estimation = STAN_LDA.objects.get(id=estimation_id)
+    estimation.status_run()
+    estimation.status_fail()
+    estimation.err_log_info = f"data generation of DGP-LDA-{data_id} failed"
+    estimation.save()
+    report_status("stan", estimation_id, estimation.task_status)
+
+
+def fail_unfinished(data_id, estimation_id, e):
+    # a pipeline that raised leaves its unfinished jobs failed; errors doing so are only logged, so the
+    # experiment task running the pipeline still returns
+    for model, kind, id in ((DGP_LDA, "dgp", data_id), (STAN_LDA, "stan", estimation_id)):
+        try:
+            obj = model.objects.get(id=id)
+            if obj.task_status not in (model.TaskStatus.PEN, model.TaskStatus.RUN):
+                continue
+            if obj.task_status == model.TaskStatus.PEN:
+                obj.status_run()
+            obj.status_fail()
+            obj.err_log_info = f"{type(e)}\n{str(e)}"
+            obj.save()
+            report_status(kind, id, obj.task_status)
+        except Exception:
+            logger.exception("pipeline: cannot mark %s job %s failed", kind, id)
+
+
+@shared_task
+def async_pipeline_task(data_id, estimation_id):
+    run_pipeline(data_id, estimation_id)
+
+
+@shared_task
+def async_sweep_item_task(item_id):
+    # never raises: a failed item would stop the chain of its lane, and with it the chord closing the sweep
+    try:
+        item = SweepItem.objects.get(id=item_id)
+    except Exception:
+        logger.exception("sweep: cannot load item %s", item_id)
+        return
+    try:
+        run_pipeline(item.data_id, item.estimation_id)
+    except Exception as e:
+        logger.exception("sweep: item %s failed", item_id)
+        fail_unfinished(item.data_id, item.estimation_id, e)
+
+
+@shared_task
+def async_sweep_finish_task(id):
+    sweep = Sweep.objects.get(id=id)
+    # wall time from submission, queueing included
+    sweep.execution_time = time.time() - sweep.timestamp.timestamp()
+    # an item whose estimation did not succeed failed, including one left unfinished by an error
+    failed = sweep.items.exclude(estimation__task_status=STAN_LDA.TaskStatus.SUC).count()
+    if failed:
+        sweep.status_fail()
+        sweep.err_log_info = f"{failed} items failed"
+    else:
+        sweep.status_success()
+    sweep.save()
+
+
+def dispatch_sweep(sweep):
+    # lanes run in parallel (a Celery group), the items of a lane one after another (a chain);
+    # the chord callback closes the sweep once every lane is done
+    # (each item goes to the estimation queue of its cost, see beak_terminal.routing)
+    items = list(sweep.items.select_related('data', 'estimation__data'))
+    lanes = assign_lanes(items, sweep.lanes)
+    chord(chain(*(async_sweep_item_task.si(item.id).set(queue=get_stan_queue(item.estimation)) for item in lane))
+          for lane in lanes)(async_sweep_finish_task.si(sweep.id))
+
+
+@shared_task
+def async_replication_task(id, index, data_id, estimation_id):
+    # never raises, so the chord closing the replication job always runs; a replication whose result
+    # cannot be appended is counted as failed
+    try:
+        run_pipeline(data_id, estimation_id)
+    except Exception as e:
+        logger.exception("replication %s: replication %s failed", id, index)
+        fail_unfinished(data_id, estimation_id, e)
+    try:
+        append_result(Replication.objects.get(id=id), index, DGP_LDA.objects.get(id=data_id),
+                      STAN_LDA.objects.get(id=estimation_id))
+    except Exception:
+        logger.exception("replication %s: cannot append the result of replication %s", id, index)
+        try:
+            Replication.objects.filter(id=id).update(failed=F("failed") + 1)
+        except Exception:
+            logger.exception("replication %s: cannot count replication %s as failed", id, index)
+
+
+@shared_task
+def async_replication_finish_task(id):
+    replication = Replication.objects.get(id=id)
+    # wall time from submission, queueing included
+    replication.execution_time = time.time() - replication.timestamp.timestamp()
+    if replication.failed:
+        replication.status_fail()
+        replication.err_log_info = f"{replication.failed} replications failed"
+    else:
+        replication.status_success()
+    replication.save()
+
+
+def dispatch_replication(replication, jobs):
+    # replications are independent, so every one is its own task and the workers' concurrency bounds
+    # how many run at once; the chord callback closes the job once all have finished
+    chord(async_replication_task.si(replication.id, index, dataset.id, estimation.id).set(
+        queue=get_stan_queue(estimation)) for index, (dataset, estimation) in enumerate(jobs))(
+        async_replication_finish_task.si(replication.id))
@@ -0,0 +1,183 @@
+import math
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+
+from dgp.models import LDA as DGP_LDA
+from stan.models import LDA as STAN_LDA
+from .models import Replication, Sweep, SweepItem
+from .replication import append_result, get_configs, get_statistics, read_results
+from .sweep import assign_lanes
+from .tasks import async_replication_finish_task, async_replication_task, async_sweep_finish_task, \
+    async_sweep_item_task
+from .views import admit_jobs, bulk_create_jobs, validate_dgp_forms
+
+BASE_CONFIG = dict(random_seed=3, sample_size=300, feature_size=3, diction_size=50, doc_size_lower_bound=5,
+                   doc_size_upper_bound=20, missing_rate=0.2, alpha_vec_str="[1,1,1]", beta0_vec_str="[1,2,3]",
+                   beta1_vec_str="[2,3,5]", betaW_vec_str="[1,-1,0.5]")
+
+
+def make_item(corpus_hash):
+    return SimpleNamespace(data=SimpleNamespace(corpus_hash=corpus_hash))
+
+
+def make_result(task_status, true_ate, estimated_ate=None, ate_q025=None, ate_q975=None):
+    # (data, estimation) of a finished replication, as append_result reads them
+    data = SimpleNamespace(id=1, random_seed=3, true_ate=true_ate, execution_time=1.0)
+    estimation = SimpleNamespace(id=2, TaskStatus=STAN_LDA.TaskStatus, task_status=task_status,
+                                 estimated_ate=estimated_ate, ate_q025=ate_q025, ate_q975=ate_q975, execution_time=2.0)
+    return data, estimation
+
+
+def finish_pipeline(data_id, estimation_id):
+    # stands in for experiment.tasks.run_pipeline: both jobs succeed, the estimate 0.5 above the true ATE
+    for model, values in ((DGP_LDA, {"true_ate": 1.0, "execution_time": 1.0}),
+                          (STAN_LDA, {"estimated_ate": 1.5, "ate_q025": 1.0, "ate_q975": 2.0, "execution_time": 2.0})):
+        obj = model.objects.get(id=data_id if model is DGP_LDA else estimation_id)
+        obj.status_run()
+        obj.status_success()
+        for field, value in values.items():
+            setattr(obj, field, value)
+        obj.save()
+
+
+def fail_seed(seed):
+    # a pipeline that raises outside its own error handling for the dataset of random seed seed
+    def run_pipeline(data_id, estimation_id):
+        if DGP_LDA.objects.get(id=data_id).random_seed == seed:
+            raise RuntimeError("pipeline failed")
+        finish_pipeline(data_id, estimation_id)
+    return run_pipeline
+
+
+class AssignLanesTest(SimpleTestCase):
+    def test_items_sharing_a_corpus_share_a_lane(self):
+        items = [make_item(corpus_hash) for corpus_hash in "aaabbcd"]
+        lanes = assign_lanes(items, 2)
+        self.assertEqual(sorted(len(lane) for lane in lanes), [3, 4])
+        self.assertEqual(sorted(id(item) for lane in lanes for item in lane), sorted(id(item) for item in items))
+        for corpus_hash in "abcd":
+            self.assertEqual(sum(any(item.data.corpus_hash == corpus_hash for item in lane) for lane in lanes), 1)
+
+    def test_no_empty_lanes(self):
+        self.assertEqual(len(assign_lanes([make_item("a"), make_item("b")], 5)), 2)
+        self.assertEqual(len(assign_lanes([make_item("a"), make_item("a")], 5)), 1)
+
+
+class ReplicationResultTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.replication = Replication.objects.create(
+            operator_name="tester", base_config=BASE_CONFIG, replications=3,
+            data_file_path=os.path.join(self.directory.name, "replication.bin"))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_statistics(self):
+        append_result(self.replication, 0, *make_result(STAN_LDA.TaskStatus.SUC, 1.0, 1.5, 1.2, 1.8))
+        append_result(self.replication, 1, *make_result(STAN_LDA.TaskStatus.ERR, 2.0))
+        append_result(self.replication, 2, *make_result(STAN_LDA.TaskStatus.SUC, 2.0, 1.5, 1.0, 2.5))
+        self.replication.refresh_from_db()
+        self.assertEqual((self.replication.completed, self.replication.failed), (2, 1))
+        statistics = get_statistics(self.replication)
+        self.assertEqual(statistics["count"], 2)
+        self.assertAlmostEqual(statistics["bias"], 0.0)
+        self.assertAlmostEqual(statistics["rmse"], 0.5)
+        self.assertEqual(statistics["coverage"], 0.5)
+
+        records = read_results(self.replication)
+        np.testing.assert_array_equal(records["index"], [0, 1, 2])
+        np.testing.assert_array_equal(records["execution_time"], [3.0, 3.0, 3.0])
+        self.assertTrue(math.isnan(records["estimated_ate"][1]))
+
+    def test_estimate_without_interval(self):
+        append_result(self.replication, 0, *make_result(STAN_LDA.TaskStatus.SUC, 1.0, 1.5))
+        self.replication.refresh_from_db()
+        self.assertEqual((self.replication.completed, self.replication.interval_count), (1, 0))
+        self.assertIsNone(get_statistics(self.replication)["coverage"])
+
+    def test_configs(self):
+        self.assertEqual([config["random_seed"] for config in get_configs(BASE_CONFIG, 3)], [3, 4, 5])
+
+
+class FailedItemTest(TestCase):
+    # an experiment whose item raises still closes, as failed, with the item's jobs failed
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.user = User.objects.create_user("tester", password="x")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_jobs(self, configs):
+        validated, err_msg = validate_dgp_forms(self.user, configs)
+        self.assertIsNone(err_msg)
+        datasets, estimations, err = admit_jobs(validated, self.user, STAN_LDA.SampleMethod.SVI,
+                                                STAN_LDA.Likelihood.TOK)
+        self.assertIsNone(err)
+        return bulk_create_jobs(datasets, estimations)
+
+    def run_sweep(self, run_pipeline):
+        sweep = Sweep.objects.create(operator_name="tester", base_config=BASE_CONFIG,
+                                     axes={"random_seed": [3, 4]}, sampler=STAN_LDA.SampleMethod.SVI, lanes=1,
+                                     task_status=Sweep.TaskStatus.RUN)
+        configs = [{**BASE_CONFIG, "random_seed": seed} for seed in (3, 4)]
+        for index, (dataset, estimation) in enumerate(zip(*self.create_jobs(configs))):
+            item = SweepItem.objects.create(sweep=sweep, index=index, params={"random_seed": dataset.random_seed},
+                                            data=dataset, estimation=estimation)
+            with mock.patch("experiment.tasks.run_pipeline", run_pipeline):
+                async_sweep_item_task(item.id)
+        async_sweep_finish_task(sweep.id)
+        sweep.refresh_from_db()
+        return sweep
+
+    def test_sweep_item_failure(self):
+        with self.assertLogs("experiment.tasks", "ERROR"):
+            sweep = self.run_sweep(fail_seed(4))
+        self.assertEqual((sweep.task_status, sweep.err_log_info), (Sweep.TaskStatus.ERR, "1 items failed"))
+        item = sweep.items.get(index=1)
+        self.assertEqual((item.data.task_status, item.estimation.task_status),
+                         (DGP_LDA.TaskStatus.ERR, STAN_LDA.TaskStatus.ERR))
+        self.assertIn("pipeline failed", item.estimation.err_log_info)
+        self.assertEqual(sweep.items.get(index=0).estimation.task_status, STAN_LDA.TaskStatus.SUC)
+
+    def test_sweep_success(self):
+        self.assertEqual(self.run_sweep(finish_pipeline).task_status, Sweep.TaskStatus.SUC)
+
+    def run_replication(self, run_pipeline, append=append_result):
+        replication = Replication.objects.create(
+            operator_name="tester", base_config=BASE_CONFIG, replications=3, task_status=Replication.TaskStatus.RUN,
+            data_file_path=os.path.join(self.directory.name, "replication.bin"))
+        datasets, estimations = self.create_jobs(get_configs(BASE_CONFIG, 3))
+        with mock.patch("experiment.tasks.run_pipeline", run_pipeline), \
+                mock.patch("experiment.tasks.append_result", append):
+            for index, (dataset, estimation) in enumerate(zip(datasets, estimations)):
+                async_replication_task(replication.id, index, dataset.id, estimation.id)
+        async_replication_finish_task(replication.id)
+        replication.refresh_from_db()
+        return replication
+
+    def test_replication_failure(self):
+        with self.assertLogs("experiment.tasks", "ERROR"):
+            replication = self.run_replication(fail_seed(4))
+        self.assertEqual((replication.task_status, replication.completed, replication.failed),
+                         (Replication.TaskStatus.ERR, 2, 1))
+        self.assertEqual(len(read_results(replication)), 3)
+
+    def test_replication_append_failure(self):
+        def append(replication, index, data, estimation):
+            if index == 0:
+                raise OSError("cannot write")
+            append_result(replication, index, data, estimation)
+
+        with self.assertLogs("experiment.tasks", "ERROR"):
+            replication = self.run_replication(finish_pipeline, append)
+        self.assertEqual((replication.task_status, replication.completed, replication.failed),
+                         (Replication.TaskStatus.ERR, 2, 1))
+        self.assertAlmostEqual(get_statistics(replication)["bias"], 0.5)
@@ -0,0 +1,14 @@
+from django.urls import path, include
+from rest_framework import routers
+from .views import *
+
+router = routers.DefaultRouter()
+router.register(r'sweep/log', SweepLogView, 'experiment_sweep_log')
+router.register(r'sweep/add', SweepTaskCreate, 'experiment_sweep_add')
+router.register(r'replication/log', ReplicationLogView, 'experiment_replication_log')
+router.register(r'replication/add', ReplicationTaskCreate, 'experiment_replication_add')
+router.register(r'pipeline/add', PipelineTaskCreate, 'experiment_pipeline_add')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
@@ -0,0 +1,386 @@
+import json
+from django.core.paginator import Paginator
+from django.db import transaction
+
+from rest_framework import viewsets, status
+from rest_framework.response import Response
+
+from beak_terminal.predictor import admit_dgp, admit_stan
+from beak_terminal.routing import get_stan_queue
+from dgp.models import LDA as DGP_LDA
+from dgp.serializers import LDA_Get_Serializer as DGP_LDA_Get_Serializer, LDA_Post_Serializer_v1
+from dgp.views import LatentDirichletAllocationDataGeneratingProcessTaskCreate as DGP_TaskCreate
+from stan.models import LDA as STAN_LDA
+from stan.serializers import LDA_Get_Serializer as STAN_LDA_Get_Serializer
+from .models import Replication, Sweep, SweepItem
+from .replication import MAX_REPLICATIONS, get_configs
+from .serializers import Sweep_Get_Serializer, Sweep_Post_Serializer, Sweep_Post_Raw_Serializer, \
+    Replication_Get_Serializer, Replication_Post_Serializer, Replication_Post_Raw_Serializer
+from .sweep import MAX_ITEMS, expand
+from .tasks import async_pipeline_task, dispatch_sweep, dispatch_replication
+
+# dgp v1 form fields a sweep may set or sweep over
+DGP_V1_FIELDS = ("random_seed", "sample_size", "feature_size", "diction_size", "doc_size_lower_bound",
+                 "doc_size_upper_bound", "missing_rate", "alpha_vec_str", "beta0_vec_str", "beta1_vec_str",
+                 "betaW_vec_str") + tuple(DGP_TaskCreate.v1_defaults)
+
+
+def validate_dgp_forms(user, configs):
+    # validated dgp rows of a list of v1 forms, or the error of the first invalid one;
+    # every form is checked before anything is created
+    dgp_view = DGP_TaskCreate()
+    validated = []
+    for index, config in enumerate(configs):
+        config = {**dgp_view.v1_defaults, **config, "operator": user}
+        err_msg = dgp_view.v1_validate_data(config)
+        if err_msg:
+            return None, f"item {index}: {err_msg}"
+        dgp_serializer = LDA_Post_Serializer_v1(data=dgp_view.v1_purify_data(config))
+        if not dgp_serializer.is_valid():
+            return None, f"item {index}: {dgp_serializer.errors}"
+        validated.append(dgp_serializer.validated_data)
+    return validated, None
+
+
+def admit_jobs(validated, operator, sampler, likelihood):
+    # unsaved dataset and estimation on it per validated dgp row, admitted like single submissions (see
+    # beak_terminal.predictor): jobs over the worker memory budget are switched, or the first that cannot be
+    # is returned as an error with its prediction. Items of the same size share one prediction.
+    datasets, estimations, admitted = [], [], {}
+    for index, validated_data in enumerate(validated):
+        dataset = DGP_LDA(**validated_data)
+        estimation = STAN_LDA(operator_id=operator, operator_name=str(operator), data=dataset, sampler=sampler,
+                              likelihood=likelihood)
+        for obj, admit, key in ((dataset, admit_dgp, ("dgp", dataset.get_size_features(), dataset.streaming,
+                                                        dataset.corpus_gen_method)),
+                                (estimation, admit_stan, ("stan", estimation.get_size_features(),
+                                                          estimation.sampler, estimation.likelihood))):
+            if key not in admitted:
+                admitted[key] = admit(obj)
+            prediction, changes, err_msg = admitted[key]
+            if err_msg:
+                return None, None, {"error": f"item {index}: {err_msg}", "prediction": prediction}
+            for field, value in changes.items():
+                setattr(obj, field, value)
+        datasets.append(dataset)
+        estimations.append(estimation)
+    return datasets, estimations, None
+
+
+def bulk_create_jobs(datasets, estimations):
+    # the admitted jobs of admit_jobs, each estimation on its created dataset
+    for dataset in datasets:
+        dataset.set_hashes()
+    datasets = DGP_LDA.objects.bulk_create(datasets)
+    for dataset, estimation in zip(datasets, estimations):
+        estimation.data = dataset
+    return datasets, STAN_LDA.objects.bulk_create(estimations)
+
+
+# Create your views here.
+class SweepLogView(viewsets.ModelViewSet):
+    serializer_class = Sweep_Get_Serializer
+    queryset = Sweep.objects.all().order_by("-timestamp")
+
+    http_method_names = ['get']
+
+    def retrieve(self, request, pk=None, *args, **kwarg):
+        instance = self.get_object()
+        return Response(self.serializer_class(instance).data, status=status.HTTP_200_OK)
+
+    def list(self, request, *args, **kwarg):
+        # No data, return
+        if len(self.queryset) == 0:
+            return Response({'detail': 'no data'}, status=status.HTTP_200_OK)
+        query = request.GET['page']
+        pages = Paginator(self.queryset, 1)
+        if query is None:
+            query = 1
+        elif type(query) is str and not query.isnumeric():
+            return Response({'error': 'illegal page num'}, status=status.HTTP_400_BAD_REQUEST)
+        query = int(query)
+        if query <= 0 or query > pages.num_pages:
+            return Response({'error': f"invalid page num, max at {pages.num_pages}"}, status=status.HTTP_404_NOT_FOUND)
+        query_set = pages.page(query).object_list
+        return Response(self.serializer_class(query_set, many=True).data, status=status.HTTP_200_OK)
+
+
+class SweepTaskCreate(viewsets.ModelViewSet):
+    serializer_class = Sweep_Post_Raw_Serializer
+    save_serializer_class = Sweep_Post_Serializer
+    display_serializer_class = Sweep_Get_Serializer
+
+    http_method_names = ['post']
+
+    def create(self, request, *args, **kwarg):
+        user = request.user
+        data = {
+            "base_config_str": request.POST.get('base_config_str', None),
+            "axes_str": request.POST.get('axes_str', None),
+            "sampler": request.POST.get('sampler', STAN_LDA.SampleMethod.VI),
+            "likelihood": request.POST.get('likelihood', STAN_LDA.Likelihood.TOK),
+            "lanes": request.POST.get('lanes', 4),
+            "operator": user,
+        }
+
+        err_msg = self.validate_data(data)
+        if err_msg:
+            return Response(data={"error": err_msg}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = self.purify_data(data)
+        grid = list(expand(data["base_config"], data["axes"]))
+        validated, err_msg = validate_dgp_forms(user, [config for _, config in grid])
+        if err_msg:
+            return Response(data={"error": err_msg}, status=status.HTTP_400_BAD_REQUEST)
+        datasets, estimations, err = admit_jobs(validated, user, data["sampler"], data["likelihood"])
+        if err:
+            return Response(data=err, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.save_serializer_class(data=data, context={'author': user})
+        if serializer.is_valid():
+            with transaction.atomic():
+                serializer.save()
+                instance = Sweep.objects.get(id=serializer.data['id'])
+                datasets, estimations = bulk_create_jobs(datasets, estimations)
+                SweepItem.objects.bulk_create([
+                    SweepItem(sweep=instance, index=index, params=params, data=dataset, estimation=estimation)
+                    for index, ((params, _), dataset, estimation) in enumerate(zip(grid, datasets, estimations))])
+                instance.status_run()
+                instance.save()
+            # Async task
+            dispatch_sweep(instance)
+            return Response(data=self.display_serializer_class(instance).data, status=status.HTTP_201_CREATED)
+        else:
+            return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def purify_data(self, data):
+        purified_schema = {
+            "operator_id": data["operator"].id,
+            "operator_name": str(data["operator"]),
+            "base_config": json.loads(data["base_config_str"]),
+            "axes": json.loads(data["axes_str"]),
+            "sampler": data["sampler"],
+            "likelihood": data["likelihood"],
+            "lanes": int(data["lanes"]),
+        }
+        return purified_schema
+
+    def validate_data(self, data):
+        def validator(field_name, check_T, **kwargs):
+            if check_T is int or check_T is float:
+                assert "valid_range" in kwargs, "Internal Error"
+                try:
+                    val = check_T(data[field_name])
+                    if not kwargs['valid_range'][0] <= val <= kwargs['valid_range'][1]:
+                        return f"incorrect {field_name.replace('_', ' ')} value; valid value can only be in [{kwargs['valid_range'][0]}, {kwargs['valid_range'][1]}]"
+                except ValueError:
+                    return f"invalid {field_name.replace('_', ' ')} input format"
+            elif check_T is json.loads:
+                field_name_str = field_name.replace('_str', '').replace('_', ' ')
+                try:
+                    obj = check_T(data[field_name] or "")
+                    if not isinstance(obj, dict):
+                        return f"invalid {field_name_str} input format; valid values i.e. {{\"field\": ...}}"
+                    for key in obj:
+                        if key not in DGP_V1_FIELDS:
+                            return f"invalid {field_name_str} field {key}; valid fields are {', '.join(DGP_V1_FIELDS)}"
+                except json.decoder.JSONDecodeError as _:
+                    return f"invalid {field_name_str} input format; valid values i.e. {{\"field\": ...}}"
+
+        err_msg = validator(field_name="base_config_str", check_T=json.loads)
+        if err_msg:
+            return err_msg
+
+        err_msg = validator(field_name="axes_str", check_T=json.loads)
+        if err_msg:
+            return err_msg
+        axes = json.loads(data["axes_str"])
+        size = 1
+        for name, values in axes.items():
+            if not isinstance(values, list) or len(values) == 0:
+                return f"axis {name} must be a non-empty list of values"
+            size *= len(values)
+        if size > MAX_ITEMS:
+            return f"sweep of {size} items is too large; at most {MAX_ITEMS} items are allowed"
+
+        if data["sampler"] not in STAN_LDA.SampleMethod.values:
+            return f"invalid sampler; valid values are {', '.join(STAN_LDA.SampleMethod.values)}"
+
+        if data["likelihood"] not in STAN_LDA.Likelihood.values:
+            return f"invalid likelihood; valid values are {', '.join(STAN_LDA.Likelihood.values)}"
+
+        err_msg = validator(field_name="lanes", check_T=int, valid_range=(1, 64))
+        if err_msg:
+            return err_msg
+
+
+class ReplicationLogView(viewsets.ModelViewSet):
+    serializer_class = Replication_Get_Serializer
+    queryset = Replication.objects.all().order_by("-timestamp")
+
+    http_method_names = ['get']
+
+    def retrieve(self, request, pk=None, *args, **kwarg):
+        instance = self.get_object()
+        return Response(self.serializer_class(instance).data, status=status.HTTP_200_OK)
+
+    def list(self, request, *args, **kwarg):
+        # No data, return
+        if len(self.queryset) == 0:
+            return Response({'detail': 'no data'}, status=status.HTTP_200_OK)
+        query = request.GET['page']
+        pages = Paginator(self.queryset, 1)
+        if query is None:
+            query = 1
+        elif type(query) is str and not query.isnumeric():
+            return Response({'error': 'illegal page num'}, status=status.HTTP_400_BAD_REQUEST)
+        query = int(query)
+        if query <= 0 or query > pages.num_pages:
+            return Response({'error': f"invalid page num, max at {pages.num_pages}"}, status=status.HTTP_404_NOT_FOUND)
+        query_set = pages.page(query).object_list
+        return Response(self.serializer_class(query_set, many=True).data, status=status.HTTP_200_OK)
+
+
+class ReplicationTaskCreate(viewsets.ModelViewSet):
+    serializer_class = Replication_Post_Raw_Serializer
+    save_serializer_class = Replication_Post_Serializer
+    display_serializer_class = Replication_Get_Serializer
+
+    http_method_names = ['post']
+
+    def create(self, request, *args, **kwarg):
+        user = request.user
+        data = {
+            "base_config_str": request.POST.get('base_config_str', None),
+            "replications": request.POST.get('replications', None),
+            "sampler": request.POST.get('sampler', STAN_LDA.SampleMethod.VI),
+            "likelihood": request.POST.get('likelihood', STAN_LDA.Likelihood.TOK),
+            "operator": user,
+        }
+
+        err_msg = self.validate_data(data)
+        if err_msg:
+            return Response(data={"error": err_msg}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = self.purify_data(data)
+        _, base_config = next(expand(data["base_config"], {}))
+        validated, err_msg = validate_dgp_forms(user, get_configs(base_config, data["replications"]))
+        if err_msg:
+            return Response(data={"error": err_msg}, status=status.HTTP_400_BAD_REQUEST)
+        datasets, estimations, err = admit_jobs(validated, user, data["sampler"], data["likelihood"])
+        if err:
+            return Response(data=err, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.save_serializer_class(data=data, context={'author': user})
+        if serializer.is_valid():
+            with transaction.atomic():
+                serializer.save()
+                instance = Replication.objects.get(id=serializer.data['id'])
+                datasets, estimations = bulk_create_jobs(datasets, estimations)
+                instance.data_file_path = instance.get_data_file_path()
+                instance.status_run()
+                instance.save()
+            # Async task
+            dispatch_replication(instance, zip(datasets, estimations))
+            return Response(data=self.display_serializer_class(instance).data, status=status.HTTP_201_CREATED)
+        else:
+            return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def purify_data(self, data):
+        purified_schema = {
+            "operator_id": data["operator"].id,
+            "operator_name": str(data["operator"]),
+            "base_config": json.loads(data["base_config_str"]),
+            "replications": int(data["replications"]),
+            "sampler": data["sampler"],
+            "likelihood": data["likelihood"],
+        }
+        return purified_schema
+
+    def validate_data(self, data):
+        def validator(field_name, check_T, **kwargs):
+            if check_T is int or check_T is float:
+                assert "valid_range" in kwargs, "Internal Error"
+                try:
+                    val = check_T(data[field_name])
+                    if not kwargs['valid_range'][0] <= val <= kwargs['valid_range'][1]:
+                        return f"incorrect {field_name.replace('_', ' ')} value; valid value can only be in [{kwargs['valid_range'][0]}, {kwargs['valid_range'][1]}]"
+                except (TypeError, ValueError):
+                    return f"invalid {field_name.replace('_', ' ')} input format"
+            elif check_T is json.loads:
+                field_name_str = field_name.replace('_str', '').replace('_', ' ')
+                try:
+                    obj = check_T(data[field_name] or "")
+                    if not isinstance(obj, dict):
+                        return f"invalid {field_name_str} input format; valid values i.e. {{\"field\": ...}}"
+                    for key in obj:
+                        if key not in DGP_V1_FIELDS:
+                            return f"invalid {field_name_str} field {key}; valid fields are {', '.join(DGP_V1_FIELDS)}"
+                except json.decoder.JSONDecodeError as _:
+                    return f"invalid {field_name_str} input format; valid values i.e. {{\"field\": ...}}"
+
+        err_msg = validator(field_name="base_config_str", check_T=json.loads)
+        if err_msg:
+            return err_msg
+
+        err_msg = validator(field_name="replications", check_T=int, valid_range=(1, MAX_REPLICATIONS))
+        if err_msg:
+            return err_msg
+
+        if data["sampler"] not in STAN_LDA.SampleMethod.values:
+            return f"invalid sampler; valid values are {', '.join(STAN_LDA.SampleMethod.values)}"
+
+        if data["likelihood"] not in STAN_LDA.Likelihood.values:
+            return f"invalid likelihood; valid values are {', '.join(STAN_LDA.Likelihood.values)}"
+
+
+class PipelineTaskCreate(viewsets.ModelViewSet):
+    # a dataset and an estimation on it, run as one task: the estimation starts from the generated arrays
+    # on the same worker while the dataset is written out (see experiment.tasks.run_pipeline)
+    http_method_names = ['post']
+
+    def create(self, request, *args, **kwarg):
+        user = request.user
+        data = {
+            "config_str": request.POST.get('config_str', None),
+            "sampler": request.POST.get('sampler', STAN_LDA.SampleMethod.VI),
+            "likelihood": request.POST.get('likelihood', STAN_LDA.Likelihood.TOK),
+            "operator": user,
+        }
+
+        err_msg = self.validate_data(data)
+        if err_msg:
+            return Response(data={"error": err_msg}, status=status.HTTP_400_BAD_REQUEST)
+
+        _, config = next(expand(json.loads(data["config_str"]), {}))
+        validated, err_msg = validate_dgp_forms(user, [config])
+        if err_msg:
+            return Response(data={"error": err_msg}, status=status.HTTP_400_BAD_REQUEST)
+        datasets, estimations, err = admit_jobs(validated, user, data["sampler"], data["likelihood"])
+        if err:
+            return Response(data=err, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            (dataset,), (estimation,) = bulk_create_jobs(datasets, estimations)
+        # Async task
+        async_pipeline_task.apply_async((dataset.id, estimation.id), queue=get_stan_queue(estimation))
+        return Response(data={"data": DGP_LDA_Get_Serializer(dataset).data,
+                              "estimation": STAN_LDA_Get_Serializer(estimation).data},
+                        status=status.HTTP_201_CREATED)
+
+    def validate_data(self, data):
+        try:
+            config = json.loads(data["config_str"] or "")
+            if not isinstance(config, dict):
+                return "invalid config input format; valid values i.e. {\"field\": ...}"
+            for key in config:
+                if key not in DGP_V1_FIELDS:
+                    return f"invalid config field {key}; valid fields are {', '.join(DGP_V1_FIELDS)}"
+        except json.decoder.JSONDecodeError as _:
+            return "invalid config input format; valid values i.e. {\"field\": ...}"
+
+        if data["sampler"] not in STAN_LDA.SampleMethod.values:
+            return f"invalid sampler; valid values are {', '.join(STAN_LDA.SampleMethod.values)}"
+
+        if data["likelihood"] not in STAN_LDA.Likelihood.values:
+            return f"invalid likelihood; valid values are {', '.join(STAN_LDA.Likelihood.values)}"
@@ -1,3 +1,7 @@
-from cmdstanpy import install_cmdstan
+from cmdstanpy import cmdstan_path, install_cmdstan
 
-install_cmdstan()
\ No newline at end of file
+# install CmdStan only when none is found, so importing this package never goes to the network otherwise
+try:
+    cmdstan_path()
+except ValueError:
+    install_cmdstan()
@@ -0,0 +1,104 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Readers of CmdStan output CSVs that parse only the columns of the requested variables. The topic
+# parameters theta (M x K) and phi (K x V) make up nearly all of an LDA-GLM output's columns, so they are
+# never parsed whole here. Of the fits themselves, cmdstanpy's CmdStanMCMC, CmdStanPathfinder and
+# CmdStanLaplace parse their draws lazily, only when asked for them; CmdStanVB parses its whole output as
+# it is built, so ADVI runs without it (see model.run_variational).
+CHUNK_SIZE = 100  # draws per chunk when a reader has to stream every column
+
+
+class CsvOutput:
+    # output CSVs of a CmdStan run made without a cmdstanpy fit object, in a directory of their own
+    def __init__(self, output_dir, csv_files):
+        self.output_dir = output_dir
+        self.csv_files = csv_files
+
+    def cleanup(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+
+def get_csv_files(stan_model_result):
+    # output CSVs of a fit (one per chain or path). cmdstanpy's MCMC and VB fits have a public runset;
+    # its Pathfinder and Laplace fits (cmdstanpy 1.x) only a private one
+    if isinstance(stan_model_result, CsvOutput):
+        return stan_model_result.csv_files
+    runset = getattr(stan_model_result, "runset", None) or getattr(stan_model_result, "_runset", None)
+    if runset is None:
+        raise RuntimeError(f"draws reading: no output CSVs on {type(stan_model_result).__name__}")
+    return runset.csv_files
+
+
+def read_header(csv_file):
+    # column names of a Stan CSV (dotted: theta.1.2), from the first non-comment line
+    with open(csv_file) as f:
+        for line in f:
+            if not line.startswith("#"):
+                return line.strip().split(",")
+    raise RuntimeError(f"draws reading: no header in {csv_file}")
+
+
+def read_adaptation(csv_file):
+    # (step size, diagonal inverse metric) from the adaptation comments CmdStan writes between the header
+    # and the first draw of a NUTS output; the metric is None unless it is diagonal
+    step_size, inv_metric = None, None
+    with open(csv_file) as f:
+        header_seen = False
+        for line in f:
+            if not line.startswith("#"):
+                if header_seen:
+                    break
+                header_seen = True
+            elif line.startswith("# Step size ="):
+                step_size = float(line.split("=")[1])
+            elif line.startswith("# Diagonal elements of inverse mass matrix:"):
+                inv_metric = np.array(next(f)[1:].split(","), dtype=float)
+    return step_size, inv_metric
+
+
+def get_column_name(stan_csv_name):
+    # theta.1.2 -> theta[1,2], the names cmdstanpy and result frames use
+    name, *index = stan_csv_name.split(".")
+    return f"{name}[{','.join(index)}]" if index else name
+
+
+def read_draws(csv_files, names, skip_rows=0, chunksize=None):
+    # DataFrame of the draws of the named variables; skip_rows drops leading rows of every file
+    # (the mean row of variational output). With chunksize, an iterator over chunks of it instead.
+    def chunks():
+        for csv_file in csv_files:
+            header = read_header(csv_file)
+            usecols = [column for column in header if column.split(".")[0] in names]
+            reader = pd.read_csv(csv_file, comment="#", usecols=usecols, dtype=np.float64,
+                                 chunksize=chunksize or CHUNK_SIZE)
+            row = 0
+            for chunk in reader:
+                start = min(max(skip_rows - row, 0), len(chunk))
+                row += len(chunk)
+                yield chunk.iloc[start:].rename(columns=get_column_name)
+
+    if chunksize is not None:
+        return chunks()
+    return pd.concat(list(chunks()), ignore_index=True)
+
+
+def read_variable_means(csv_files, names, skip_rows=0, nrows=None):
+    # means over the draws of the named variables, shaped as Stan variables (column-major in the CSV)
+    sums, count = None, 0
+    for chunk in read_draws(csv_files, names, skip_rows=skip_rows, chunksize=CHUNK_SIZE):
+        if nrows is not None:
+            chunk = chunk.iloc[:max(nrows - count, 0)]
+        sums = chunk.sum() if sums is None else sums + chunk.sum()
+        count += len(chunk)
+    means = {}
+    for name in names:
+        columns = [column for column in sums.index if column.split("[")[0] == name]
+        if columns == [name]:
+            means[name] = float(sums[name] / count)
+        elif columns:
+            index = np.array([column[len(name) + 1:-1].split(",") for column in columns], dtype=int)
+            means[name] = (sums[columns].to_numpy() / count).reshape(tuple(index.max(axis=0)), order="F")
+    return means
@@ -1,14 +1,36 @@
-import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
 
 import numpy as np
 import pandas as pd
-from cmdstanpy import CmdStanModel
+from cmdstanpy import write_stan_json
 
+from beak_terminal.progress import ProgressReporter
+from beak_terminal.resources import StageMetrics
+from dgp.lda.corpus import get_corpus_file_path, load_omega
+from dgp.lda.sampler import concat_csr, count_tokens
+from dgp.lda.storage import read_columnar
+from dgp.models import LDA as DGP_LDA
 from ..models import LDA
+from .draws import CsvOutput, get_csv_files, read_draws
+from .registry import get_model
+from .svi import run as svi_run
+from .warmstart import find_warm_start, get_warm_start_args, needs_fit, save_fit
+
+
+# CmdStan's default warmup and sampling iterations per chain
+CMDSTAN_ITER_WARMUP = 1000
+CMDSTAN_ITER_SAMPLING = 1000
 
 
 class DGP_DATA_LOADER:
-    def __init__(self, dgp_lda_obj):
+    OMEGA_CHUNK_SIZE = 50000
+
+    def __init__(self, dgp_lda_obj, arrays=None):
         self.sample_size = dgp_lda_obj.sample_size
         self.feature_size = dgp_lda_obj.feature_size
         self.diction_size = dgp_lda_obj.diction_size
@@ -16,59 +38,307 @@ class DGP_DATA_LOADER:
         self.beta = np.array(dgp_lda_obj.gamma_null, dtype=float)
 
         data_path = dgp_lda_obj.data_file_path
-        df = pd.read_csv(data_path)
-        assert "W" in df.columns, f"no necessary field W in {data_path}"
-        assert "Y" in df.columns, f"no necessary field Y in {data_path}"
-        assert "omega" in df.columns, f"no necessary field omega in {data_path}"
-        self.treatment = np.array(df["W"], dtype=int)
-        self.result = np.array(df["Y"], dtype=float)
-
-        real_omega = [json.loads(omega_record_str) for omega_record_str in df["omega"]]
-        self.total_word_cnt = 0
-        self.word_arr = []
-        self.doc_arr = []
-        for doc_id, omega_record in enumerate(real_omega):
-            self.total_word_cnt += len(omega_record)
-            self.doc_arr += [doc_id + 1] * len(omega_record)
-            self.word_arr += (np.array(omega_record, dtype=int) + 1).tolist()
-        assert len(self.word_arr) == len(self.doc_arr) == self.total_word_cnt, "total word count is inconsistent with two array inputs"
-
-        self.X = np.array(df[[f"X{i}" for i in range(self.feature_size)]])
-
-
-def run(id):
-    stan_lda_obj = LDA.objects.get(id=id)
-    dgp_lda_obj = stan_lda_obj.data
-    data = DGP_DATA_LOADER(dgp_lda_obj)
+        if arrays is not None:
+            self.load_arrays(arrays)
+        elif dgp_lda_obj.data_format == DGP_LDA.DataFormat.COL:
+            self.load_columnar(data_path)
+        else:
+            self.load_csv(data_path)
+        assert len(self.word_pairs) == len(self.doc_pairs) == len(self.count_pairs), "corpus pair arrays are inconsistent"
+
+    def load_arrays(self, arrays):
+        # a dataset handed over in memory by the generating Executor (see dgp.lda.model.Executor.arrays)
+        self.treatment = arrays["W"]
+        self.result = arrays["Y"]
+        self.X = arrays["X"]
+        omega = arrays["omega"]
+        assert omega.shape[1] == self.diction_size, f"corpus shape {omega.shape} is inconsistent with data"
+        self.load_omega(omega.indptr, omega.indices, omega.data)
+
+    def load_columnar(self, data_path):
+        # X, W and Y stay memory mapped; only the token arrays handed to Stan are materialized
+        columns, _ = read_columnar(data_path)
+        for name in ("X", "Y", "W", "omega_offsets", "omega_indices", "omega_counts"):
+            assert name in columns, f"no necessary field {name} in {data_path}"
+        self.treatment = columns["W"]
+        self.result = columns["Y"]
+        self.X = columns["X"]
+        self.load_omega(columns["omega_offsets"], columns["omega_indices"], columns["omega_counts"])
+
+    def load_csv(self, data_path):
+        # only X, W and Y are parsed; every other column of the CSV is skipped by the reader
+        header = pd.read_csv(data_path, nrows=0).columns
+        x_columns = [f"X{i}" for i in range(self.feature_size)]
+        for name in x_columns + ["W", "Y"]:
+            assert name in header, f"no necessary field {name} in {data_path}"
+        df = pd.read_csv(data_path, usecols=x_columns + ["W", "Y"],
+                         dtype={"W": np.int8, "Y": np.float64, **{name: np.float64 for name in x_columns}})
+        self.treatment = df["W"].to_numpy()
+        self.result = df["Y"].to_numpy()
+        self.X = df[x_columns].to_numpy()
+        del df
+
+        corpus_path = get_corpus_file_path(data_path)
+        if os.path.exists(corpus_path):
+            omega = load_omega(corpus_path)
+            assert omega.shape[1] == self.diction_size, f"corpus shape {omega.shape} is inconsistent with data"
+            self.load_omega(omega.indptr, omega.indices, omega.data)
+        else:
+            self.load_legacy_omega(header, data_path)
+
+    def load_omega(self, offsets, indices, counts):
+        # the corpus as 1-based (doc, word, count) triples, one per distinct word of a document
+        assert len(offsets) == self.sample_size + 1, f"corpus of {len(offsets) - 1} docs is inconsistent with data"
+        self.doc_pairs = np.repeat(np.arange(1, self.sample_size + 1, dtype=np.int32), np.diff(offsets))
+        self.word_pairs = indices.astype(np.int32) + 1
+        self.count_pairs = np.asarray(counts, dtype=np.int32)
+        self.total_word_cnt = int(self.count_pairs.sum())
+
+    def tokens(self):
+        # word and doc arrays with one entry per word occurrence
+        return np.repeat(self.word_pairs, self.count_pairs), np.repeat(self.doc_pairs, self.count_pairs)
+
+    def load_legacy_omega(self, header, data_path):
+        # datasets generated before the CSR corpus keep omega as a string column of the CSV;
+        # only that column is read, OMEGA_CHUNK_SIZE documents at a time
+        assert "omega" in header or "omega_counts" in header, f"no necessary field omega in {data_path}"
+        column = "omega_counts" if "omega_counts" in header else "omega"
+        chunks = pd.read_csv(data_path, usecols=[column], dtype={column: str}, keep_default_na=False,
+                             chunksize=self.OMEGA_CHUNK_SIZE)
+        self.load_omega(*concat_csr(self.parse_omega_chunk(chunk[column], column == "omega_counts")
+                                    for chunk in chunks))
+
+    def parse_omega_chunk(self, records, counted):
+        # CSR arrays of a chunk of omega strings: brackets are stripped and the numbers of all
+        # records are parsed by a single np.fromstring call
+        records = records.str.replace(r"[\[\]\s]", "", regex=True)
+        sizes = np.where(records.str.len() > 0, records.str.count(",") + 1, 0)
+        values = np.fromstring(",".join(records[sizes > 0]), dtype=np.int64, sep=",")
+        assert len(values) == sizes.sum(), "invalid omega input format"
+        if counted:
+            # count mode corpus: each document is a list of [word id, count] pairs
+            indptr = np.zeros(len(sizes) + 1, dtype=np.int64)
+            np.cumsum(sizes // 2, out=indptr[1:])
+            return indptr, values[0::2], values[1::2]
+        doc = np.repeat(np.arange(len(sizes)), sizes)
+        return count_tokens(doc, values, len(sizes), self.diction_size)
+
+
+def get_sampler_progress_hook(progress, chain_ids, total):
+    # CmdStan sampler console lines, "[Chain [id] ]Iteration: n / total [..%] (Warmup)", as progress in
+    # iterations done over all chains
+    pattern = re.compile(r'(Chain \[(\d+)\] )?Iteration:\s+(\d+)')
+    done = dict.fromkeys(chain_ids, 0)
+
+    def hook(line, idx):
+        match = pattern.match(line)
+        if match is not None:
+            done[int(match.group(2) or chain_ids[idx])] = int(match.group(3))
+            progress("sampling", sum(done.values()), total * len(chain_ids))
+    return hook
+
+
+class SamplerConsole:
+    # progress of a NUTS run read from the console files cmdstanpy writes in the run's output directory,
+    # "<model>-<time>_<index>-stdout.txt" per chain process (no index when one process runs every chain),
+    # polled on a thread of its own while the chains run
+    POLL_INTERVAL = 1.0
+    FILE_PATTERN = re.compile(r'(?:_(\d+))?-stdout\.txt$')
+
+    def __init__(self, output_dir, progress, chain_ids, total):
+        self.output_dir = output_dir
+        self.hook = get_sampler_progress_hook(progress, chain_ids, total)
+        self.offsets = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.poll, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
 
+    def poll(self):
+        while not self.stopped.wait(self.POLL_INTERVAL):
+            self.read()
+        self.read()
+
+    def read(self):
+        # complete lines written since the last read; a partial last line is read again next time
+        for name in sorted(os.listdir(self.output_dir)):
+            match = self.FILE_PATTERN.search(name)
+            if match is None:
+                continue
+            with open(os.path.join(self.output_dir, name), "rb") as f:
+                f.seek(self.offsets.get(name, 0))
+                chunk = f.read()
+            end = chunk.rfind(b"\n") + 1
+            self.offsets[name] = self.offsets.get(name, 0) + end
+            for line in chunk[:end].decode(errors="replace").splitlines():
+                self.hook(line.strip(), int(match.group(1) or 0))
+
+
+def get_program_data(data, likelihood, threads_per_chain=1):
+    # (program, data) of a loaded dataset for the likelihood. Programs other than lda-glm shard the corpus
+    # likelihood with reduce_sum (grainsize 1 leaves the partitioning to the scheduler) and run
+    # threads_per_chain threads per NUTS chain.
     data_dic = {
         "M": data.sample_size,
         "V": data.diction_size,
         "K": data.feature_size,
-        "N": data.total_word_cnt,
-        "word": data.word_arr,
-        "doc": data.doc_arr,
         "alpha": data.alpha,
         "beta": data.beta,
         "y": data.result,
         "W": data.treatment,
     }
+    if likelihood == LDA.Likelihood.CNT:
+        # one entry per distinct (doc, word) pair, its log-sum-exp term weighted by the count
+        program = "lda-glm-counts"
+        data_dic.update({"N": len(data.word_pairs), "word": data.word_pairs, "doc": data.doc_pairs,
+                         "count": data.count_pairs, "grainsize": 1})
+    elif likelihood == LDA.Likelihood.TOK:
+        program = "lda-glm-threaded" if threads_per_chain > 1 else "lda-glm"
+        word_arr, doc_arr = data.tokens()
+        data_dic.update({"N": data.total_word_cnt, "word": word_arr, "doc": doc_arr})
+        if program == "lda-glm-threaded":
+            data_dic["grainsize"] = 1
+    else:
+        raise RuntimeError("invalid likelihood")
+    return program, data_dic
+
+
+def save_ate_draws(stan_lda_obj, X_mean, B0, B1):
+    # ATE of every draw at once: the average of X @ (beta_T1 - beta_T0) over documents is mean(X) @ (...)
+    ate_draws = X_mean @ (B1 - B0).T
+    stan_lda_obj.estimated_ate = float(np.mean(ate_draws))
+    stan_lda_obj.ate_sd = float(np.std(ate_draws))
+    stan_lda_obj.ate_q025, stan_lda_obj.ate_q50, stan_lda_obj.ate_q975 = np.quantile(ate_draws, [0.025, 0.5, 0.975])
+    os.makedirs(os.path.dirname(stan_lda_obj.data_file_path), exist_ok=True)
+    np.save(stan_lda_obj.data_file_path, ate_draws)
+
+
+def run(id, arrays=None):
+    # arrays: the dataset in memory, when it was just generated in this process; otherwise it is read
+    # from its stored file. Every phase is measured in stage_metrics (time, peak memory, items).
+    stan_lda_obj = LDA.objects.get(id=id)
+    dgp_lda_obj = stan_lda_obj.data
+    progress = ProgressReporter("stan", id)
+    metrics = StageMetrics()
+    if stan_lda_obj.sampler == LDA.SampleMethod.SVI:
+        # in-process engine streaming the stored dataset; the corpus is never loaded whole
+        with metrics.stage("sample", items=dgp_lda_obj.sample_size):
+            draws = svi_run(dgp_lda_obj, arrays, progress)
+        with metrics.stage("save", items=len(draws[1])):
+            save_ate_draws(stan_lda_obj, *draws)
+        stan_lda_obj.stage_metrics = metrics.as_list()
+        stan_lda_obj.save()
+        return
+    progress("loading data")
+    with metrics.stage("load_data", items=dgp_lda_obj.sample_size):
+        data = DGP_DATA_LOADER(dgp_lda_obj, arrays)
 
-    stan_model = CmdStanModel(stan_file=".media/models/lda-glm.stan")
+    with metrics.stage("likelihood_data") as counts:
+        program, data_dic = get_program_data(data, stan_lda_obj.likelihood, stan_lda_obj.threads_per_chain)
+        counts["items"] = data_dic["N"]
+    progress("loading model")
+    with metrics.stage("load_model"):
+        stan_model = get_model(program)
 
+    warm_start_args = {}
+    if stan_lda_obj.warm_start:
+        with metrics.stage("warm_start"):
+            source = find_warm_start(stan_lda_obj)
+            if source is not None:
+                warm_start_args = get_warm_start_args(stan_lda_obj, source)
+                stan_lda_obj.warm_start_source = source
+
+    progress("sampling")
+    with metrics.stage("sample", parallel_children=stan_lda_obj.get_parallel_processes()):
+        stan_model_result = run_sampler(stan_lda_obj, dgp_lda_obj, stan_model, program, data_dic, warm_start_args,
+                                        progress)
+
+    try:
+        progress("reading draws")
+        with metrics.stage("read_draws") as counts:
+            # only the outcome coefficients are parsed from the output; the first row of ADVI output is its mean
+            result_df = read_draws(get_csv_files(stan_model_result), ("beta_T0", "beta_T1"),
+                                   skip_rows=1 if stan_lda_obj.sampler == LDA.SampleMethod.VI else 0)
+            counts["items"] = len(result_df)
+
+        B0 = np.array(result_df[[f"beta_T0[{i + 1}]" for i in range(data.feature_size)]])
+        B1 = np.array(result_df[[f"beta_T1[{i + 1}]" for i in range(data.feature_size)]])
+
+        with metrics.stage("save", items=len(result_df)):
+            save_ate_draws(stan_lda_obj, np.mean(data.X, axis=0), B0, B1)
+            if needs_fit(stan_lda_obj):
+                save_fit(stan_lda_obj, stan_model, stan_model_result)
+    finally:
+        if isinstance(stan_model_result, CsvOutput):
+            stan_model_result.cleanup()
+        elif stan_lda_obj.sampler == LDA.SampleMethod.NUT:
+            shutil.rmtree(os.path.dirname(get_csv_files(stan_model_result)[0]), ignore_errors=True)
+    stan_lda_obj.stage_metrics = metrics.as_list()
+    stan_lda_obj.save()
+
+
+def run_variational(stan_model, data_dic, seed, inits=None):
+    # ADVI through the CmdStan command line rather than stan_model.variational, whose CmdStanVB parses every
+    # column of the output (theta and phi included) as it is built. Like cmdstanpy by default, a run that
+    # may not have converged fails.
+    output_dir = tempfile.mkdtemp(prefix="stan-lda-vi-")
+    data_file = os.path.join(output_dir, "data.json")
+    csv_file = os.path.join(output_dir, "output.csv")
+    write_stan_json(data_file, data_dic)
+    command = [stan_model.exe_file, "variational", "data", f"file={data_file}"]
+    if inits:
+        init_file = os.path.join(output_dir, "inits.json")
+        write_stan_json(init_file, inits)
+        command.append(f"init={init_file}")
+    command += ["random", f"seed={seed}", "output", f"file={csv_file}"]
+    process = subprocess.run(command, cwd=output_dir, capture_output=True, text=True)
+    if process.returncode != 0:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise RuntimeError(f"Error during variational inference: {(process.stderr or process.stdout)[-2000:]}")
+    if "The algorithm may not have converged" in process.stdout:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise RuntimeError("The algorithm may not have converged.")
+    return CsvOutput(output_dir, [csv_file])
+
+
+def run_sampler(stan_lda_obj, dgp_lda_obj, stan_model, program, data_dic, warm_start_args, progress):
     if stan_lda_obj.sampler == LDA.SampleMethod.VI:
-        stan_model_result = stan_model.variational(data=data_dic)
-        name_dic = {}
-        for cnt, name in enumerate(stan_model_result.column_names):
-            name_dic[cnt] = name
-        result_df = stan_model_result.variational_sample.rename(columns=name_dic)
+        stan_model_result = run_variational(stan_model, data_dic, dgp_lda_obj.random_seed,
+                                            warm_start_args.get("inits"))
     elif stan_lda_obj.sampler == LDA.SampleMethod.NUT:
-        stan_model_result = stan_model.sample(data=data_dic)
+        # chains run as parallel processes in an output directory of this run (removed by run), whose console
+        # files are tailed for progress; the model is shared by every task of the worker and is left as is.
+        # cmdstanpy writes the console files through a block buffer, so CmdStan reports every iteration to
+        # keep them moving.
+        threads_per_chain = stan_lda_obj.threads_per_chain if program != "lda-glm" else None
+        output_dir = tempfile.mkdtemp(prefix="stan-lda-nuts-")
+        chain_ids = list(range(1, stan_lda_obj.chains + 1))
+        total = warm_start_args.get("iter_warmup", CMDSTAN_ITER_WARMUP) + CMDSTAN_ITER_SAMPLING
+        try:
+            with SamplerConsole(output_dir, progress, chain_ids, total):
+                stan_model_result = stan_model.sample(data=data_dic, chains=stan_lda_obj.chains,
+                                                      chain_ids=chain_ids, parallel_chains=stan_lda_obj.chains,
+                                                      threads_per_chain=threads_per_chain,
+                                                      seed=dgp_lda_obj.random_seed, output_dir=output_dir,
+                                                      refresh=1, show_progress=False, **warm_start_args)
+        except Exception:
+            shutil.rmtree(output_dir, ignore_errors=True)
+            raise
+    elif stan_lda_obj.sampler == LDA.SampleMethod.PAT:
+        # multi-path Pathfinder; the paths run on threads_per_chain threads with a threaded program
+        num_threads = stan_lda_obj.threads_per_chain if program != "lda-glm" else None
+        stan_model_result = stan_model.pathfinder(data=data_dic, seed=dgp_lda_obj.random_seed,
+                                                  num_threads=num_threads, **warm_start_args)
+    elif stan_lda_obj.sampler == LDA.SampleMethod.LAP:
+        # draws from the normal approximation at the posterior mode; warm start inits go to the optimizer
+        stan_model_result = stan_model.laplace_sample(data=data_dic, seed=dgp_lda_obj.random_seed,
+                                                      opt_args=warm_start_args or None)
     else:
         raise RuntimeError("invalid sampler")
-
-    beta0_avg = np.average(np.array(result_df[[f"beta_T0[{i + 1}]" for i in range(data.feature_size)]]), axis=0)
-    beta1_avg = np.average(np.array(result_df[[f"beta_T1[{i + 1}]" for i in range(data.feature_size)]]), axis=0)
-
-    stan_lda_obj.estimated_ate = np.average(data.X @ (beta1_avg - beta0_avg))
-    stan_lda_obj.save()
\ No newline at end of file
+    return stan_model_result
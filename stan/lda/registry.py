@@ -0,0 +1,72 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+from cmdstanpy import CmdStanModel, cmdstan_version
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PROGRAM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "programs")
+
+# Stan programs by name: source file (in PROGRAM_DIR) and the C++ options it is compiled with
+PROGRAMS = {
+    "lda-glm": {"stan_file": "lda-glm.stan", "cpp_options": {}},
+    "lda-glm-threaded": {"stan_file": "lda-glm-threaded.stan", "cpp_options": {"STAN_THREADS": True}},
+    "lda-glm-counts": {"stan_file": "lda-glm-counts.stan", "cpp_options": {"STAN_THREADS": True}},
+}
+
+# programs loaded by this process, name -> (content hash, CmdStanModel)
+_loaded = {}
+
+
+def get_program_path(name):
+    if name not in PROGRAMS:
+        raise RuntimeError(f"stan model loading: invalid program {name}")
+    return os.path.join(PROGRAM_DIR, PROGRAMS[name]["stan_file"])
+
+
+def get_content_hash(name):
+    # an executable is reusable as long as the program source, its compile options and CmdStan are unchanged
+    with open(get_program_path(name), "rb") as f:
+        source = f.read()
+    key = json.dumps({"cpp_options": PROGRAMS[name]["cpp_options"], "cmdstan": cmdstan_version()}, sort_keys=True)
+    return hashlib.sha256(source + key.encode()).hexdigest()[:32]
+
+
+def compile_cached(name, content_hash):
+    # Compile the program into <STAN_MODEL_CACHE_DIR>/<content hash>/ unless an executable is already there.
+    # The directory lock makes concurrent workers wait for a single compile instead of racing it.
+    cache_dir = os.path.join(settings.STAN_MODEL_CACHE_DIR, content_hash)
+    os.makedirs(cache_dir, exist_ok=True)
+    stan_file = os.path.join(cache_dir, os.path.basename(get_program_path(name)))
+    exe_file = os.path.splitext(stan_file)[0]
+    with open(os.path.join(cache_dir, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not os.path.exists(exe_file):
+            shutil.copyfile(get_program_path(name), stan_file)
+            CmdStanModel(stan_file=stan_file, cpp_options=PROGRAMS[name]["cpp_options"], compile="force")
+        return CmdStanModel(stan_file=stan_file, exe_file=exe_file, compile=False)
+
+
+def get_model(name):
+    # compiled model of a program; the source is re-hashed so an edited program is picked up without a restart
+    content_hash = get_content_hash(name)
+    if name not in _loaded or _loaded[name][0] != content_hash:
+        _loaded[name] = (content_hash, compile_cached(name, content_hash))
+    return _loaded[name][1]
+
+
+def prewarm():
+    # compile (or load) every registered program, so tasks run on this process never wait for a compile
+    for name in PROGRAMS:
+        if not os.path.exists(get_program_path(name)):
+            logger.warning("stan model prewarm: %s not found, skipped", get_program_path(name))
+            continue
+        try:
+            get_model(name)
+        except Exception:
+            logger.exception("stan model prewarm: failed to compile %s", name)
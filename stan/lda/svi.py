@@ -0,0 +1,162 @@
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.special import psi
+
+from dgp.lda.corpus import get_corpus_file_path, open_omega_columns
+from dgp.lda.storage import read_columnar, read_omega_rows
+from dgp.models import LDA as DGP_LDA
+
+# Minibatch stochastic variational inference for LDA-GLM (online LDA, Hoffman et al. 2010), in process.
+# Documents are streamed from the stored dataset BATCH_SIZE at a time, so memory is bounded by the batch
+# and the K x V topic parameters, whatever the number of documents.
+# The fit is two-stage: the topic model is learned from the corpus alone, then the outcome coefficients of
+# each treatment arm get the conjugate normal-inverse-gamma posterior of a Gaussian linear model of Y on
+# E[theta], accumulated over a final pass as normal equations. The noise variance is estimated with the
+# coefficients, so it also takes up part of the error of E[theta] as a regressor; the uncertainty of the
+# topics themselves is not propagated, so intervals are narrower than they should be on small corpora. The
+# normal(0, 10) prior of the Stan programs is the ridge term (in units of the noise variance, as conjugacy
+# requires).
+BATCH_SIZE = 1024
+EPOCHS = 2
+TAU0 = 1.0  # learning rate (TAU0 + t) ** -KAPPA at update t
+KAPPA = 0.7
+LOCAL_ITERS = 100  # max fixed-point iterations of a batch's document parameters
+LOCAL_TOL = 1e-3
+PRIOR_VAR = 100.0
+NOISE_PRIOR = (1.0, 1.0)  # (shape, scale) of the inverse-gamma prior of the noise variance
+DRAWS = 1000  # draws of the outcome coefficients' Gaussian posterior
+
+
+def dirichlet_expectation(a):
+    # E[log x] for x ~ Dirichlet(a), row-wise
+    return psi(a) - psi(a.sum(axis=1, keepdims=True))
+
+
+class DatasetBatches:
+    # (omega, W, Y) of consecutive document batches of a stored dataset, read without loading it whole,
+    # or of a dataset handed over in memory as arrays
+    def __init__(self, dgp_lda_obj, batch_size=BATCH_SIZE, arrays=None):
+        self.sample_size = dgp_lda_obj.sample_size
+        self.diction_size = dgp_lda_obj.diction_size
+        self.batch_size = batch_size
+        data_path = dgp_lda_obj.data_file_path
+        if arrays is not None:
+            self.columns = {"W": arrays["W"], "Y": arrays["Y"]}
+            self.omega = arrays["omega"]
+        elif dgp_lda_obj.data_format == DGP_LDA.DataFormat.COL:
+            self.columns, _ = read_columnar(data_path)
+            self.omega = None
+        else:
+            corpus_path = get_corpus_file_path(data_path)
+            if not os.path.exists(corpus_path):
+                raise RuntimeError(f"svi: {data_path} has no CSR corpus; regenerate the dataset")
+            # the CSV rows are parsed once, W and Y being small next to the corpus, which is memory mapped
+            # from its npz
+            df = pd.read_csv(data_path, usecols=["W", "Y"], dtype={"W": np.int8, "Y": np.float64})
+            self.columns = {"W": df["W"].to_numpy(), "Y": df["Y"].to_numpy(), **open_omega_columns(corpus_path)}
+            self.omega = None
+
+    def starts(self):
+        return range(0, self.sample_size, self.batch_size)
+
+    def __getitem__(self, start):
+        end = min(start + self.batch_size, self.sample_size)
+        if self.omega is None:
+            omega = read_omega_rows(self.columns, start, end, self.diction_size)
+        else:
+            omega = self.omega[start:end]
+        return omega, np.asarray(self.columns["W"][start:end]), np.asarray(self.columns["Y"][start:end])
+
+
+class OnlineLDA:
+    def __init__(self, alpha, beta, sample_size, rng):
+        self.alpha = alpha
+        self.beta = beta
+        self.sample_size = sample_size
+        self.rng = rng
+        self.updates = 0
+        # variational Dirichlet parameters of the topics, K x V
+        self.lam = rng.gamma(100.0, 1.0 / 100.0, (len(alpha), len(beta)))
+        self.exp_elog_phi = np.exp(dirichlet_expectation(self.lam))
+
+    def e_step(self, omega):
+        # document parameters gamma of a batch, and the batch's expected topic-word counts
+        omega = sparse.csr_matrix(omega, dtype=float)
+        doc = np.repeat(np.arange(omega.shape[0]), np.diff(omega.indptr))
+        gamma = self.rng.gamma(100.0, 1.0 / 100.0, (omega.shape[0], len(self.alpha)))
+        exp_elog_theta = np.exp(dirichlet_expectation(gamma))
+        for _ in range(LOCAL_ITERS):
+            last_gamma = gamma
+            norm = np.einsum("ik,ki->i", exp_elog_theta[doc], self.exp_elog_phi[:, omega.indices]) + 1e-100
+            ratio = sparse.csr_matrix((omega.data / norm, omega.indices, omega.indptr), shape=omega.shape)
+            gamma = self.alpha + exp_elog_theta * (ratio @ self.exp_elog_phi.T)
+            exp_elog_theta = np.exp(dirichlet_expectation(gamma))
+            if np.mean(np.abs(gamma - last_gamma)) < LOCAL_TOL:
+                break
+        norm = np.einsum("ik,ki->i", exp_elog_theta[doc], self.exp_elog_phi[:, omega.indices]) + 1e-100
+        ratio = sparse.csr_matrix((omega.data / norm, omega.indices, omega.indptr), shape=omega.shape)
+        sstats = self.exp_elog_phi * (ratio.T @ exp_elog_theta).T
+        return gamma, sstats
+
+    def update(self, omega):
+        _, sstats = self.e_step(omega)
+        rho = (TAU0 + self.updates) ** -KAPPA
+        self.lam = (1 - rho) * self.lam + rho * (self.beta + self.sample_size / omega.shape[0] * sstats)
+        self.exp_elog_phi = np.exp(dirichlet_expectation(self.lam))
+        self.updates += 1
+
+    def theta_mean(self, omega):
+        gamma, _ = self.e_step(omega)
+        return gamma / gamma.sum(axis=1, keepdims=True)
+
+
+def run(dgp_lda_obj, arrays=None, progress=None):
+    # mean E[theta] over documents, and DRAWS posterior draws of beta_T0 and beta_T1
+    # (the learned topics need not be in the order of the generating ones, so the ATE is taken over
+    # E[theta] rather than the DGP's X)
+    rng = np.random.default_rng(dgp_lda_obj.random_seed)
+    batches = DatasetBatches(dgp_lda_obj, arrays=arrays)
+    lda = OnlineLDA(np.array(dgp_lda_obj.alpha, dtype=float), np.array(dgp_lda_obj.gamma_null, dtype=float),
+                    dgp_lda_obj.sample_size, rng)
+    starts = np.array(batches.starts())
+    for _ in range(EPOCHS):
+        for start in rng.permutation(starts):
+            omega, _, _ = batches[start]
+            lda.update(omega)
+            if progress is not None:
+                progress("fitting topics", lda.updates, EPOCHS * len(starts))
+
+    K = dgp_lda_obj.feature_size
+    precision = {arm: np.eye(K) / PRIOR_VAR for arm in (0, 1)}
+    moment = {arm: np.zeros(K) for arm in (0, 1)}
+    count = {arm: 0 for arm in (0, 1)}
+    square_sum = {arm: 0.0 for arm in (0, 1)}
+    theta_sum = np.zeros(K)
+    for index, start in enumerate(starts):
+        if progress is not None:
+            progress("fitting outcomes", index, len(starts))
+        omega, W, Y = batches[start]
+        theta = lda.theta_mean(omega)
+        theta_sum += theta.sum(axis=0)
+        for arm in (0, 1):
+            # rows with W == -1 are unobserved and left out of both arms
+            precision[arm] += theta[W == arm].T @ theta[W == arm]
+            moment[arm] += theta[W == arm].T @ Y[W == arm]
+            count[arm] += int(np.sum(W == arm))
+            square_sum[arm] += float(Y[W == arm] @ Y[W == arm])
+    B0, B1 = (draw_coefficients(precision[arm], moment[arm], count[arm], square_sum[arm], rng) for arm in (0, 1))
+    return theta_sum / dgp_lda_obj.sample_size, B0, B1
+
+
+def draw_coefficients(precision, moment, count, square_sum, rng):
+    # DRAWS draws of the coefficients of one arm from its normal-inverse-gamma posterior: the noise variance
+    # from its inverse-gamma marginal, then the coefficients given it
+    mean = np.linalg.solve(precision, moment)
+    shape = NOISE_PRIOR[0] + count / 2
+    scale = NOISE_PRIOR[1] + max(square_sum - mean @ precision @ mean, 0.0) / 2
+    noise_var = scale / rng.gamma(shape, 1.0, size=DRAWS)
+    factor = np.linalg.cholesky(np.linalg.inv(precision))
+    return mean + np.sqrt(noise_var)[:, None] * (rng.standard_normal((DRAWS, len(mean))) @ factor.T)
@@ -0,0 +1,64 @@
+import json
+import os
+
+import numpy as np
+from cmdstanpy import write_stan_json
+from django.conf import settings
+
+from ..models import LDA
+from .draws import get_csv_files, read_adaptation, read_variable_means
+
+# NUTS warmup when the prior fit also provides an adapted step size and metric
+WARM_ITER_WARMUP = 200
+# parameters left out of saved fits: the per-document topic mixtures (M x K) are the bulk of the output,
+# and Stan draws inits of the parameters missing from a warm start at random
+FIT_EXCLUDED = ("theta",)
+
+
+def needs_fit(stan_lda_obj):
+    # a fit is saved for jobs warm starting themselves, which later ones on the dataset can start from, or
+    # for every job with STAN_SAVE_FITS
+    return stan_lda_obj.warm_start or settings.STAN_SAVE_FITS
+
+
+def save_fit(stan_lda_obj, stan_model, stan_model_result):
+    # Persist what a later job on the same dataset can start from: the posterior means of the parameters,
+    # and for NUTS fits the adapted step size and diagonal metric (averaged over chains), read from the
+    # adaptation comments of the output.
+    parameters = tuple(name for name in stan_model.src_info()["parameters"] if name not in FIT_EXCLUDED)
+    csv_files = get_csv_files(stan_model_result)
+    if stan_lda_obj.sampler == LDA.SampleMethod.VI:
+        # the first row of ADVI output is the mean of the approximation
+        fit = read_variable_means(csv_files, parameters, nrows=1)
+    else:
+        fit = read_variable_means(csv_files, parameters)
+    if stan_lda_obj.sampler == LDA.SampleMethod.NUT:
+        adaptations = [read_adaptation(csv_file) for csv_file in csv_files]
+        if all(inv_metric is not None for _, inv_metric in adaptations):
+            fit["inv_metric"] = np.mean([inv_metric for _, inv_metric in adaptations], axis=0)
+            stan_lda_obj.step_size = float(np.mean([step_size for step_size, _ in adaptations]))
+    stan_lda_obj.fit_file_path = stan_lda_obj.get_fit_file_path()
+    os.makedirs(os.path.dirname(stan_lda_obj.fit_file_path), exist_ok=True)
+    write_stan_json(stan_lda_obj.fit_file_path, fit)
+
+
+def find_warm_start(stan_lda_obj):
+    # latest successful fit on the same dataset, NUTS fits (with a metric) before VI ones
+    candidates = LDA.objects.filter(data=stan_lda_obj.data, task_status=LDA.TaskStatus.SUC,
+                                    fit_file_path__isnull=False).exclude(id=stan_lda_obj.id).order_by('-timestamp')
+    for candidate in sorted(candidates, key=lambda candidate: candidate.step_size is None):
+        if os.path.exists(candidate.fit_file_path):
+            return candidate
+    return None
+
+
+def get_warm_start_args(stan_lda_obj, source):
+    # keyword arguments starting stan_lda_obj's sampler from the fit of source
+    with open(source.fit_file_path) as f:
+        fit = json.load(f)
+    inv_metric = fit.pop("inv_metric", None)
+    args = {"inits": fit}
+    if stan_lda_obj.sampler == LDA.SampleMethod.NUT and inv_metric is not None and source.step_size is not None:
+        args.update({"inv_metric": np.array(inv_metric), "step_size": source.step_size,
+                     "iter_warmup": WARM_ITER_WARMUP})
+    return args
@@ -0,0 +1,29 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:40
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stan", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lda",
+            name="chains",
+            field=models.IntegerField(default=4, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(16)]),
+        ),
+        migrations.AddField(
+            model_name="lda",
+            name="threads_per_chain",
+            field=models.IntegerField(default=1, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(64)]),
+        ),
+        migrations.AlterField(
+            model_name="lda",
+            name="sampler",
+            field=models.CharField(choices=[("vi", "Variational Inference"), ("nut", "Non U-Turn Metropolis Hasting")], default="vi", max_length=16),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stan", "0002_lda_chains_threads_per_chain"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lda",
+            name="likelihood",
+            field=models.CharField(choices=[("token", "PER TOKEN"), ("count", "PER (DOC, WORD) COUNT")], default="token", max_length=16),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stan", "0003_lda_likelihood"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lda",
+            name="fit_file_path",
+            field=models.CharField(blank=True, max_length=4096, null=True),
+        ),
+        migrations.AddField(
+            model_name="lda",
+            name="step_size",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="lda",
+            name="warm_start",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name="lda",
+            name="warm_start_source",
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="warm_started", to="stan.lda"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stan", "0005_lda_sampler_svi"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="lda",
+            name="sampler",
+            field=models.CharField(choices=[("vi", "Variational Inference"), ("nut", "Non U-Turn Metropolis Hasting"), ("svi", "Stochastic Variational Inference (in process)"), ("pathfinder", "Pathfinder"), ("laplace", "Laplace Approximation")], default="vi", max_length=16),
+        ),
+    ]
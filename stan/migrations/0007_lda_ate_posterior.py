@@ -0,0 +1,33 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stan", "0006_lda_sampler_pathfinder_laplace"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lda",
+            name="ate_q025",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="lda",
+            name="ate_q50",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="lda",
+            name="ate_q975",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="lda",
+            name="ate_sd",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 16:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("stan", "0007_lda_ate_posterior"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="lda",
+            name="peak_memory",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
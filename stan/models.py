@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.validators import MaxValueValidator, MinValueValidator
 
 from dgp.models import LDA as DGP_LDA
 
@@ -12,9 +13,20 @@ class LDA(models.Model):
         ERR = "failure", "FAILURE"
         SUC = "success", "SUCCESS"
 
+    class Likelihood(models.TextChoices):
+        TOK = "token", "PER TOKEN"
+        CNT = "count", "PER (DOC, WORD) COUNT"
+
     class SampleMethod(models.TextChoices):
         VI = "vi", "Variational Inference"
         NUT = "nut", "Non U-Turn Metropolis Hasting"
+        SVI = "svi", "Stochastic Variational Inference (in process)"
+        PAT = "pathfinder", "Pathfinder"
+        LAP = "laplace", "Laplace Approximation"
+
+    # relative cost of the samplers on the same dataset
+    SAMPLER_COST = {SampleMethod.SVI: 1, SampleMethod.VI: 10, SampleMethod.LAP: 10, SampleMethod.PAT: 20,
+                    SampleMethod.NUT: 100}
 
     # operator
     operator_id = models.ForeignKey(User, null=True, on_delete=models.SET_NULL, related_name='stan_operator_id')
@@ -26,20 +38,59 @@ class LDA(models.Model):
     data = models.ForeignKey(DGP_LDA, on_delete=models.CASCADE)
     # sample method
     sampler = models.CharField(max_length=16, choices=SampleMethod.choices, default=SampleMethod.VI)
+    # corpus likelihood: one term per token, or one count-weighted term per distinct (doc, word) pair
+    likelihood = models.CharField(max_length=16, choices=Likelihood.choices, default=Likelihood.TOK)
+    # NUTS chains, run in parallel
+    chains = models.IntegerField(default=4, validators=[MinValueValidator(1), MaxValueValidator(16)])
+    # NUTS threads per chain; above 1 the token likelihood is sharded across threads by reduce_sum
+    threads_per_chain = models.IntegerField(default=1, validators=[MinValueValidator(1), MaxValueValidator(64)])
+    # start from the latest successful fit on the same data (inits, and step size and metric for NUTS)
+    warm_start = models.BooleanField(default=True)
+    # fit this job was warm started from
+    warm_start_source = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL,
+                                          related_name='warm_started')
     # task status
     task_status = models.CharField(max_length=8, choices=TaskStatus.choices, default=TaskStatus.PEN)
 
-    # estimated ATE
+    # estimated ATE (posterior mean)
     estimated_ate = models.FloatField(blank=True, null=True)
+    # posterior standard deviation, median and 95% credible interval of the ATE
+    ate_sd = models.FloatField(blank=True, null=True)
+    ate_q025 = models.FloatField(blank=True, null=True)
+    ate_q50 = models.FloatField(blank=True, null=True)
+    ate_q975 = models.FloatField(blank=True, null=True)
     # execution time in seconds
     execution_time = models.FloatField(blank=True, null=True)
+    # peak resident memory in MB, CmdStan processes included
+    peak_memory = models.FloatField(blank=True, null=True)
+    # per-stage breakdown: [{"stage", "seconds", "peak_memory", "items", "calls"}] in run order
+    stage_metrics = models.JSONField(default=list, blank=True)
     # err log information
     err_log_info = models.CharField(max_length=1000000, blank=True, null=True)
-    # csv file saving path
+    # ATE draws saving path (.npy)
     data_file_path = models.CharField(max_length=4096, blank=True, null=True)
+    # posterior means (and NUTS metric) of the fit, as Stan JSON, for warm starting later jobs
+    fit_file_path = models.CharField(max_length=4096, blank=True, null=True)
+    # mean adapted NUTS step size
+    step_size = models.FloatField(blank=True, null=True)
 
     def get_data_file_path(self):
-        return f"./media/stan/lda/stan-lda-{self.id}.csv"
+        return f"./media/stan/lda/stan-lda-{self.id}-ate.npy"
+
+    def get_fit_file_path(self):
+        return f"./media/stan/lda/stan-lda-{self.id}-fit.json"
+
+    def get_cost(self):
+        # estimated cost: the dataset's generating cost scaled by the sampler; NUTS chains each take a process
+        return self.data.get_cost() * self.SAMPLER_COST[self.sampler] * self.get_parallel_processes()
+
+    def get_parallel_processes(self):
+        # CmdStan processes running at once
+        return self.chains if self.sampler == self.SampleMethod.NUT else 1
+
+    def get_size_features(self):
+        # size parameters runtime and peak memory are predicted from (see beak_terminal.predictor)
+        return self.data.get_size_features()[:4] + (self.get_parallel_processes(), self.threads_per_chain)
 
     def status_run(self):
         assert self.task_status == self.TaskStatus.PEN, "cannot update task status to RUNNING from other than PENDING"
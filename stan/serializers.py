@@ -3,6 +3,9 @@ from .models import LDA
 
 
 class LDA_Get_Serializer(serializers.ModelSerializer):
+    # execution time of the latest successful job of each sampler on the same data, for comparison
+    sampler_execution_times = serializers.SerializerMethodField()
+
     class Meta:
         model = LDA
         fields = ('id',
@@ -11,9 +14,28 @@ class LDA_Get_Serializer(serializers.ModelSerializer):
                   'operator_name',
                   'timestamp',
                   'estimated_ate',
+                  'ate_sd',
+                  'ate_q025',
+                  'ate_q50',
+                  'ate_q975',
                   'execution_time',
+                  'peak_memory',
+                  'stage_metrics',
                   'data_file_path',
-                  'sampler')
+                  'sampler',
+                  'likelihood',
+                  'chains',
+                  'threads_per_chain',
+                  'warm_start',
+                  'warm_start_source',
+                  'step_size',
+                  'sampler_execution_times')
+
+    def get_sampler_execution_times(self, obj):
+        times = {}
+        for job in LDA.objects.filter(data=obj.data, task_status=LDA.TaskStatus.SUC).order_by('timestamp'):
+            times[job.sampler] = job.execution_time
+        return times
 
 
 class LDA_Post_Raw_Serializer(serializers.ModelSerializer):
@@ -24,6 +46,10 @@ class LDA_Post_Raw_Serializer(serializers.ModelSerializer):
         fields = (
             'dgp_lda_id',
             'sampler',
+            'likelihood',
+            'chains',
+            'threads_per_chain',
+            'warm_start',
         )
 
 
@@ -35,5 +61,9 @@ class LDA_Post_Serializer(serializers.ModelSerializer):
             'operator_id',
             'operator_name',
             'sampler',
+            'likelihood',
+            'chains',
+            'threads_per_chain',
+            'warm_start',
             'data',
         )
@@ -2,28 +2,40 @@ import time
 
 from celery import shared_task
 
+from beak_terminal.progress import report_status
+from beak_terminal.resources import PeakMemory
 from .models import LDA
 from .lda.model import run as lda_run
 
 
 @shared_task
 def async_stan_lda_task(id):
+    run_stan_lda_task(id)
+
+
+def run_stan_lda_task(id, arrays=None):
+    # the estimation task in the calling process; arrays is the dataset when it is already in memory
     # Prepare for the task
     stan_lda_obj = LDA.objects.get(id=id)
     stan_lda_obj.data_file_path = stan_lda_obj.get_data_file_path()
     stan_lda_obj.status_run()
     stan_lda_obj.save()
+    report_status("stan", id, stan_lda_obj.task_status)
 
     try:
         start_time = time.time()
-        lda_run(id)
+        with PeakMemory(parallel_children=stan_lda_obj.get_parallel_processes()) as memory:
+            lda_run(id, arrays)
         duration = time.time() - start_time
         stan_lda_obj = LDA.objects.get(id=id)
         stan_lda_obj.execution_time = duration
+        stan_lda_obj.peak_memory = memory.peak
         stan_lda_obj.status_success()
         stan_lda_obj.save()
+        report_status("stan", id, stan_lda_obj.task_status)
     except Exception as e:
         stan_lda_obj = LDA.objects.get(id=id)
         stan_lda_obj.status_fail()
         stan_lda_obj.err_log_info = f"{type(e)}\n{str(e)}"
         stan_lda_obj.save()
+        report_status("stan", id, stan_lda_obj.task_status)
@@ -1,3 +1,292 @@
-from django.test import TestCase
+import os
+import re
+import sys
+import tempfile
+from types import SimpleNamespace
+from unittest import skipUnless
 
-# Create your tests here.
+import numpy as np
+from cmdstanpy import cmdstan_path
+from django.test import SimpleTestCase
+from scipy.special import logsumexp
+
+from dgp.models import LDA as DGP_LDA
+from dgp.tests import make_executor
+from .lda.draws import CsvOutput, get_csv_files, read_adaptation, read_draws
+from .lda.model import DGP_DATA_LOADER, SamplerConsole, get_program_data, run_variational
+from .lda.svi import DatasetBatches, run as svi_run
+from .lda.registry import PROGRAMS, get_model, get_program_path
+from .models import LDA
+
+
+def has_cmdstan():
+    try:
+        cmdstan_path()
+        return True
+    except ValueError:
+        return False
+
+
+def read_blocks(name):
+    # {block name: statements} of a Stan program, comments stripped and one statement line per entry
+    with open(get_program_path(name)) as f:
+        source = f.read()
+    blocks = {}
+    for match in re.finditer(r"^(functions|data|parameters|model) \{$", source, re.M):
+        depth, end = 0, match.end() - 1
+        for end in range(match.end() - 1, len(source)):
+            depth += {"{": 1, "}": -1}.get(source[end], 0)
+            if depth == 0:
+                break
+        blocks[match.group(1)] = source[match.end():end].split("\n")
+    return blocks
+
+
+def get_statements(lines):
+    return [re.sub(r"\s+", " ", line.split("//")[0]).strip() for line in lines if line.split("//")[0].strip()]
+
+
+def without_corpus_likelihood(lines):
+    # a model block but for its corpus likelihood: the lines after the "// corpus likelihood" comment up to
+    # the next blank line
+    start = [line.strip() for line in lines].index("// corpus likelihood")
+    end = next(index for index in range(start, len(lines)) if not lines[index].strip())
+    return lines[:start] + lines[end:]
+
+
+class ProgramVariantTest(SimpleTestCase):
+    # the lda-glm-* programs are lda-glm.stan with another corpus likelihood statement, so switching a job
+    # between them never changes the model fitted
+    DATA_ADDITIONS = {
+        "lda-glm-threaded": ["int<lower=1> grainsize;"],
+        "lda-glm-counts": ["array[N] int<lower=1> count;", "int<lower=1> grainsize;"],
+    }
+
+    def test_every_program_is_shipped(self):
+        for name in PROGRAMS:
+            self.assertTrue(os.path.exists(get_program_path(name)), name)
+
+    def test_variants_match_base_program(self):
+        base = read_blocks("lda-glm")
+        for name in PROGRAMS:
+            if name == "lda-glm":
+                continue
+            variant = read_blocks(name)
+            with self.subTest(program=name):
+                self.assertEqual(get_statements(variant["parameters"]), get_statements(base["parameters"]))
+                data = get_statements(variant["data"])
+                self.assertEqual([line for line in data if line not in self.DATA_ADDITIONS[name]],
+                                 get_statements(base["data"]))
+                self.assertEqual(sorted(set(data) - set(get_statements(base["data"]))),
+                                 sorted(self.DATA_ADDITIONS[name]))
+                self.assertEqual(get_statements(without_corpus_likelihood(variant["model"])),
+                                 get_statements(without_corpus_likelihood(base["model"])))
+
+
+def corpus_log_likelihood(data_dic, theta, phi):
+    # the corpus likelihood statement of the lda-glm programs, with theta (M x K) and phi (K x V)
+    terms = logsumexp(np.log(theta)[data_dic["doc"] - 1] + np.log(phi).T[data_dic["word"] - 1], axis=1)
+    return float(np.sum(terms * data_dic.get("count", 1)))
+
+
+class LikelihoodTest(SimpleTestCase):
+    # the count likelihood takes the corpus as distinct (doc, word) pairs weighted by their counts, which
+    # gives the same posterior as the token likelihood
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        executor = make_executor(os.path.join(self.directory.name, "data"), sample_size=40, diction_size=12,
+                                 gamma_null=np.full(12, 0.5))
+        executor()
+        self.omega = executor.omega
+        dgp_lda_obj = SimpleNamespace(sample_size=40, feature_size=3, diction_size=12, alpha=[1.0] * 3,
+                                      gamma_null=[0.5] * 12, data_file_path=None, data_format=DGP_LDA.DataFormat.COL)
+        self.data = DGP_DATA_LOADER(dgp_lda_obj, executor.arrays())
+        rng = np.random.default_rng(0)
+        self.theta = rng.dirichlet(np.ones(3), 40)
+        self.phi = rng.dirichlet(np.ones(12), 3)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_count_and_token_data_agree(self):
+        _, tokens = get_program_data(self.data, LDA.Likelihood.TOK)
+        _, counts = get_program_data(self.data, LDA.Likelihood.CNT)
+        self.assertEqual(tokens["N"], self.omega.sum())
+        self.assertEqual(counts["N"], self.omega.nnz)
+        self.assertEqual(counts["count"].sum(), tokens["N"])
+        # the document-term matrix either way
+        dense = np.zeros((40, 12), dtype=int)
+        np.add.at(dense, (tokens["doc"] - 1, tokens["word"] - 1), 1)
+        np.testing.assert_array_equal(dense, self.omega.toarray())
+        dense[:] = 0
+        dense[counts["doc"] - 1, counts["word"] - 1] = counts["count"]
+        np.testing.assert_array_equal(dense, self.omega.toarray())
+
+    def test_count_and_token_likelihoods_agree(self):
+        _, tokens = get_program_data(self.data, LDA.Likelihood.TOK)
+        _, counts = get_program_data(self.data, LDA.Likelihood.CNT)
+        self.assertAlmostEqual(corpus_log_likelihood(counts, self.theta, self.phi),
+                               corpus_log_likelihood(tokens, self.theta, self.phi), places=8)
+
+    @skipUnless(has_cmdstan(), "CmdStan is not installed")
+    def test_count_and_token_programs_agree(self):
+        params = {"theta": self.theta, "phi": self.phi, "beta_T0": np.zeros(3), "beta_T1": np.ones(3), "sigma": 1.5}
+        log_probs = []
+        for likelihood in (LDA.Likelihood.TOK, LDA.Likelihood.CNT):
+            program, data_dic = get_program_data(self.data, likelihood)
+            log_probs.append(float(get_model(program).log_prob(params=params, data=data_dic)["lp__"].iloc[0]))
+        self.assertAlmostEqual(log_probs[0], log_probs[1], places=4)
+
+
+# a NUTS output of CmdStan, shortened: config comments, header, adaptation comments, draws, timing comments
+NUTS_CSV = """# stan_version_major = 2
+# model = lda_glm_model
+# method = sample (Default)
+#   sample
+#     num_samples = 3
+#     adapt
+#       stepsize = 1 (Default)
+lp__,accept_stat__,stepsize__,treedepth__,n_leapfrog__,divergent__,energy__,beta_T0.1,beta_T0.2,sigma
+# Adaptation terminated
+# Step size = 0.254
+# Diagonal elements of inverse mass matrix:
+# 0.5, 0.25, 2
+-10.5,0.9,0.254,3,7,0,11.2,1.5,-0.5,1.1
+-10.1,0.8,0.254,3,7,0,10.9,1.7,-0.25,0.9
+-10.9,0.95,0.254,2,3,0,11.5,1.6,-0.75,1.0
+#
+#  Elapsed Time: 0.1 seconds (Warm-up)
+"""
+
+
+class DrawsReadingTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.csv_file = os.path.join(self.directory.name, "output-1.csv")
+        with open(self.csv_file, "w") as f:
+            f.write(NUTS_CSV)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_read_adaptation(self):
+        step_size, inv_metric = read_adaptation(self.csv_file)
+        self.assertEqual(step_size, 0.254)
+        np.testing.assert_array_equal(inv_metric, [0.5, 0.25, 2.0])
+
+    def test_read_adaptation_without_metric(self):
+        lines = NUTS_CSV.split("\n")
+        with open(self.csv_file, "w") as f:
+            f.write("\n".join(line for line in lines if "mass matrix" not in line and "# 0.5" not in line))
+        self.assertEqual(read_adaptation(self.csv_file), (0.254, None))
+
+    def test_read_draws_selects_columns(self):
+        draws = read_draws([self.csv_file, self.csv_file], ("beta_T0",))
+        self.assertEqual(list(draws.columns), ["beta_T0[1]", "beta_T0[2]"])
+        np.testing.assert_array_equal(draws["beta_T0[2]"], [-0.5, -0.25, -0.75] * 2)
+
+
+class SVITest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def generate(self, data_format):
+        path = os.path.join(self.directory.name, f"data.{data_format}")
+        make_executor(path, sample_size=300, data_format=data_format)()
+        return SimpleNamespace(random_seed=7, data_file_path=path, data_format=data_format, sample_size=300,
+                               feature_size=3, diction_size=40, alpha=[1.0] * 3, gamma_null=[0.1] * 40)
+
+    def test_csv_corpus_is_memory_mapped(self):
+        batches = DatasetBatches(self.generate(DGP_LDA.DataFormat.CSV), batch_size=100)
+        self.assertIsNone(batches.omega)
+        self.assertIsInstance(batches.columns["omega_indices"], np.memmap)
+
+    def test_csv_and_columnar_fits_agree(self):
+        columnar = svi_run(self.generate(DGP_LDA.DataFormat.COL))
+        csv = svi_run(self.generate(DGP_LDA.DataFormat.CSV))
+        for expected, actual in zip(columnar, csv):
+            np.testing.assert_allclose(actual, expected)
+
+    def test_noise_variance_is_estimated(self):
+        # draws spread with the residual noise of the outcome rather than a fixed unit variance
+        _, B0, B1 = svi_run(self.generate(DGP_LDA.DataFormat.COL))
+        self.assertEqual(B0.shape, (1000, 3))
+        self.assertTrue(np.all(np.isfinite(B1)))
+
+
+# stand-in for a compiled program's executable: checks its command line like CmdStan would and writes an
+# ADVI output, the mean row first
+FAKE_EXECUTABLE = """#!{python}
+import json, sys
+args = sys.argv[1:]
+assert args[0] == "variational" and args[1] == "data" and args[-4:-2] == ["random", "seed=11"], args
+assert args[-2] == "output", args
+data_file, output_file = args[2].split("=", 1)[1], args[-1].split("=", 1)[1]
+json.load(open(data_file))
+if args[3].startswith("init="):
+    json.load(open(args[3].split("=", 1)[1]))
+with open(output_file, "w") as f:
+    f.write("# method = variational\\nlp__,log_p__,log_g__,beta_T0.1,theta.1.1\\n0,0,0,1.5,0.2\\n")
+    f.write("0,-3,-1,1.25,0.3\\n0,-3,-1,1.75,0.1\\n")
+print("{message}")
+"""
+
+
+class FitOutputTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_csv_files(self):
+        # fits keep their runset public (MCMC, VB) or private (Pathfinder, Laplace)
+        csv_files = [os.path.join(self.directory.name, "output-1.csv")]
+        runset = SimpleNamespace(csv_files=csv_files)
+        for fit in (SimpleNamespace(runset=runset), SimpleNamespace(_runset=runset),
+                    CsvOutput(self.directory.name, csv_files)):
+            with self.subTest(fit=fit):
+                self.assertEqual(get_csv_files(fit), csv_files)
+        with self.assertRaisesRegex(RuntimeError, "no output CSVs"):
+            get_csv_files(SimpleNamespace())
+
+    def make_model(self, message=""):
+        exe_file = os.path.join(self.directory.name, "lda-glm")
+        with open(exe_file, "w") as f:
+            f.write(FAKE_EXECUTABLE.format(python=sys.executable, message=message))
+        os.chmod(exe_file, 0o755)
+        return SimpleNamespace(exe_file=exe_file)
+
+    def test_run_variational(self):
+        output = run_variational(self.make_model(), {"N": 2, "y": np.zeros(2)}, 11,
+                                 inits={"beta_T0": np.ones(1)})
+        draws = read_draws(get_csv_files(output), ("beta_T0",), skip_rows=1)
+        np.testing.assert_array_equal(draws["beta_T0[1]"], [1.25, 1.75])
+        output.cleanup()
+        self.assertFalse(os.path.exists(output.output_dir))
+
+    def test_run_variational_not_converged(self):
+        with self.assertRaisesRegex(RuntimeError, "not have converged"):
+            run_variational(self.make_model("The algorithm may not have converged."), {"N": 2}, 11)
+
+    def test_sampler_console(self):
+        # one console file per chain process and one of a process running every chain; partial lines wait
+        reports = []
+        console = SamplerConsole(self.directory.name, lambda *args: reports.append(args), [1, 2, 3], 10)
+        with open(os.path.join(self.directory.name, "lda-glm-1_0-stdout.txt"), "w") as f:
+            f.write("method = sample\nIteration: 1 / 10 [ 10%]  (Warmup)\nIteration: 5")
+        console.read()
+        self.assertEqual(reports, [("sampling", 1, 30)])
+        with open(os.path.join(self.directory.name, "lda-glm-1_0-stdout.txt"), "a") as f:
+            f.write(" / 10 [ 50%]  (Warmup)\n")
+        with open(os.path.join(self.directory.name, "lda-glm-1_1-stdout.txt"), "w") as f:
+            f.write("Iteration: 2 / 10 [ 20%]  (Warmup)\n")
+        with open(os.path.join(self.directory.name, "lda-glm-2-stdout.txt"), "w") as f:
+            f.write("Chain [3] Iteration: 10 / 10 [100%]  (Sampling)\n")
+        console.read()
+        self.assertEqual(reports[-1], ("sampling", 17, 30))
+        console.read()
+        self.assertEqual(len(reports), 4)
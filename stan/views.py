@@ -7,6 +7,8 @@ from rest_framework.response import Response
 
 from .serializers import LDA_Get_Serializer, LDA_Post_Serializer, LDA_Post_Raw_Serializer
 from .models import LDA
+from beak_terminal.predictor import admit_stan
+from beak_terminal.routing import get_stan_queue
 from dgp.models import LDA as DGP_LDA
 from .tasks import async_stan_lda_task
 
@@ -51,6 +53,10 @@ class LatentDirichletAllocationSTANTaskCreate(viewsets.ModelViewSet):
         data = {
             "dgp_lda_id": request.POST.get('dgp_lda_id', None),
             "sampler": request.POST.get('sampler', None),
+            "likelihood": request.POST.get('likelihood', LDA.Likelihood.TOK),
+            "chains": request.POST.get('chains', 4),
+            "threads_per_chain": request.POST.get('threads_per_chain', 1),
+            "warm_start": request.POST.get('warm_start', 'true'),
             "operator": user,
         }
 
@@ -61,11 +67,17 @@ class LatentDirichletAllocationSTANTaskCreate(viewsets.ModelViewSet):
         data = self.purify_data(data)
         serializer = self.save_serializer_class(data=data, context={'author': user})
         if serializer.is_valid():
-            serializer.save()
+            # predicted runtime and memory; a job over the worker memory budget is switched or rejected
+            prediction, changes, err_msg = admit_stan(LDA(**serializer.validated_data))
+            if err_msg:
+                return Response(data={"error": err_msg, "prediction": prediction}, status=status.HTTP_400_BAD_REQUEST)
+            serializer.save(**changes)
             instance = LDA.objects.filter(id=serializer.data['id']).first()
             # Async task
-            async_stan_lda_task.delay(serializer.data['id'])
-            return Response(data=self.display_serializer_class(instance).data, status=status.HTTP_201_CREATED)
+            async_stan_lda_task.apply_async((instance.id,), queue=get_stan_queue(instance))
+            return Response(data={**self.display_serializer_class(instance).data,
+                                  "prediction": {**prediction, "switched": changes}},
+                            status=status.HTTP_201_CREATED)
         else:
             return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -74,6 +86,10 @@ class LatentDirichletAllocationSTANTaskCreate(viewsets.ModelViewSet):
             "operator_id": data["operator"].id,
             "operator_name": str(data["operator"]),
             'sampler': data['sampler'],
+            'likelihood': data['likelihood'],
+            'chains': int(data['chains']),
+            'threads_per_chain': int(data['threads_per_chain']),
+            'warm_start': str(data['warm_start']).lower() == "true",
             'data': DGP_LDA.objects.get(id=int(data["dgp_lda_id"])).id,
         }
         return purified_schema
@@ -98,3 +114,17 @@ class LatentDirichletAllocationSTANTaskCreate(viewsets.ModelViewSet):
                 return "unavailable data because its status is not SUCCESS"
         except ObjectDoesNotExist:
             return "invalid data id because it does not exist or has been deleted"
+
+        if data["likelihood"] not in LDA.Likelihood.values:
+            return f"invalid likelihood; valid values are {', '.join(LDA.Likelihood.values)}"
+
+        err_msg = validator(field_name="chains", check_T=int, valid_range=(1, 16))
+        if err_msg:
+            return err_msg
+
+        err_msg = validator(field_name="threads_per_chain", check_T=int, valid_range=(1, 64))
+        if err_msg:
+            return err_msg
+
+        if str(data["warm_start"]).lower() not in ("true", "false"):
+            return "invalid warm start input format; valid values are true, false"